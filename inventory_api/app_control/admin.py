@@ -1,8 +1,91 @@
+from datetime import datetime
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Case, Max, Min, When
+from django.utils import timezone
+from inventory_api.utils import EstimatedCountPaginator
 from .models import Inventory, InventoryGroup, Shop
+from .stock import shard_total
 
 # Register your models here.
-admin.site.register((Inventory, InventoryGroup, Shop))
 # This allows you to manage and interact with the data of these models through the admin interface.
 # By registering the models, you can perform CRUD (Create, Read, Update, Delete) operations on the model instances, 
-# view and edit their fields, and perform other administrative tasks.
\ No newline at end of file
+# view and edit their fields, and perform other administrative tasks.
+
+class YearRangeChangeList(ChangeList):
+  '''
+  For a list spanning several years, the date hierarchy asks for the distinct years of the column, a DISTINCT over the
+  whole table. The years are listed from its MIN and MAX instead, which its index answers directly (a year without rows
+  in between shows an empty list).
+  '''
+  def get_queryset(self, request):
+    queryset = super().get_queryset(request)
+    datetimes = queryset.datetimes
+    
+    def year_range(field_name, kind, *args, **kwargs):
+      if kind != "year":
+        return datetimes(field_name, kind, *args, **kwargs)
+      bounds = queryset.aggregate(first=Min(field_name), last=Max(field_name))
+      if bounds["first"] is None:
+        return []
+      first, last = (timezone.localtime(bound) for bound in (bounds["first"], bounds["last"]))
+      return [datetime(year, 1, 1) for year in range(first.year, last.year + 1)]
+    
+    # The date_hierarchy template tag reads the years from the change list queryset itself
+    queryset.datetimes = year_range
+    return queryset
+    
+class LargeTableAdmin(admin.ModelAdmin):
+  '''
+  Settings shared by the admins of tables that grow to millions of rows:
+  - the page count of an unfiltered list is estimated instead of counted (EstimatedCountPaginator), and filtered lists
+    skip the extra COUNT(*) of the whole table that Django runs to show "x of y selected"
+  - foreign keys are picked with autocomplete widgets instead of select boxes listing every user or group
+  - search uses exact, case-insensitive matches ("=" prefix), which the UPPER(...) indexes on the searched columns serve
+  - the change list can be narrowed down by creation date, without listing the distinct years (YearRangeChangeList)
+  '''
+  paginator = EstimatedCountPaginator
+  show_full_result_count = False
+  date_hierarchy = "created_at"
+  list_per_page = 50
+  
+  def get_changelist(self, request, **kwargs):
+    return YearRangeChangeList
+  
+@admin.register(InventoryGroup)
+class InventoryGroupAdmin(LargeTableAdmin):
+  list_display = ("name", "belongs_to", "created_by", "created_at")
+  list_select_related = ("belongs_to", "created_by")
+  autocomplete_fields = ("belongs_to", "created_by")
+  search_fields = ("=name", )
+  
+@admin.register(Inventory)
+class InventoryAdmin(LargeTableAdmin):
+  list_display = ("code", "name", "group", "stock", "price", "created_by", "created_at")
+  list_select_related = ("group", "created_by")
+  autocomplete_fields = ("group", "created_by")
+  search_fields = ("=code", "=name")
+  # The remaining column is not kept up to date for hot items, the stock shown is Inventory.stock_remaining
+  exclude = ("remaining", )
+  readonly_fields = ("code", "hot_shards", "stock")
+  
+  def get_readonly_fields(self, request, obj=None):
+    # Like the API, the stock of an existing item only changes through the stock ledger
+    return self.readonly_fields + ("total", ) if obj is not None else self.readonly_fields
+  
+  def get_queryset(self, request):
+    # legacy_photo can hold large base64 blobs that the admin never shows
+    return super().get_queryset(request).defer("legacy_photo").annotate(
+      shard_remaining=Case(When(hot_shards__gt=0, then=shard_total()))
+    )
+  
+  @admin.display(description="remaining")
+  def stock(self, item):
+    return item.stock_remaining
+  
+@admin.register(Shop)
+class ShopAdmin(LargeTableAdmin):
+  list_display = ("name", "created_by", "created_at")
+  list_select_related = ("created_by", )
+  autocomplete_fields = ("created_by", )
+  search_fields = ("=name", )
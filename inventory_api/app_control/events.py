@@ -0,0 +1,17 @@
+from django.db import transaction
+from inventory_api.broadcast import get_broadcaster
+
+'''
+Stock change events pushed to the clients of the /events/stock stream (see inventory_api/sse.py), so that they do not have
+to poll InventoryView for changes. Events are only published once the transaction that made the change has committed.
+'''
+
+def item_channels(item):
+  channels = ["inventory"]
+  if item.group_id is not None:
+    channels.append(f"group:{item.group_id}")
+  return channels
+
+def publish_stock_change(item, channels):
+  event = {"id": item.id, "remaining": item.stock_remaining, "price": item.price, "group_id": item.group_id}
+  transaction.on_commit(lambda: get_broadcaster().publish(channels, event))
@@ -0,0 +1,33 @@
+from django.db.models import Q, Sum
+from inventory_api.filters import FilterSet, to_datetime
+from .models import Inventory, InventoryGroup, InventoryStockShard, Shop
+
+class InventoryFilter(FilterSet):
+  model = Inventory
+  exact_fields = {"group_id": int, "created_by_id": int}
+  range_fields = {"price": float, "remaining": int, "created_at": to_datetime}
+  
+  def filter(self, queryset):
+    stock_lookups = {param: value for param, value in self.lookups.items() if param.partition("__")[0] == "remaining"}
+    if not stock_lookups:
+      return super().filter(queryset)
+    
+    # The remaining column is not kept up to date for hot items, their stock is the sum of their shards. There are only
+    # a few hot items, the ones in range are found from their shards first so that the rest still uses the remaining index
+    shard_lookups = {param.replace("remaining", "stock", 1): value for param, value in stock_lookups.items()}
+    hot_items = list(
+      InventoryStockShard.objects.order_by().values("item").annotate(stock=Sum("remaining"))
+      .filter(**shard_lookups).values_list("item", flat=True)
+    )
+    other_lookups = {param: value for param, value in self.lookups.items() if param not in stock_lookups}
+    return queryset.filter(**other_lookups).filter(Q(hot_shards=0, **stock_lookups) | Q(id__in=hot_items))
+    
+class InventoryGroupFilter(FilterSet):
+  model = InventoryGroup
+  exact_fields = {"belongs_to_id": int, "created_by_id": int}
+  range_fields = {"created_at": to_datetime}
+  
+class ShopFilter(FilterSet):
+  model = Shop
+  exact_fields = {"created_by_id": int}
+  range_fields = {"created_at": to_datetime}
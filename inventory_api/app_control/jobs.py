@@ -0,0 +1,15 @@
+from job_control.queue import job
+from .photos import generate_thumbnails
+from .stock import find_stock_mismatches, take_snapshots
+
+@job("app_control.generate_thumbnails")
+def thumbnails_job(inventory_id):
+  generate_thumbnails(inventory_id)
+  
+@job("app_control.take_stock_snapshots", public=True)
+def take_stock_snapshots_job():
+  return {"snapshots": take_snapshots()}
+
+@job("app_control.check_stock_ledger", max_attempts=1, public=True)
+def check_stock_ledger_job():
+  return {"mismatches": list(find_stock_mismatches())}
@@ -0,0 +1,73 @@
+import gzip
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from inventory_api.compression import brotli
+from inventory_api.renderers import FastJSONRenderer, orjson
+
+def sample_page(rows):
+  '''
+  A page of InventoryView as InventorySerializer renders it, with the nested created_by user and group.
+  '''
+  user = {
+    "id": 1, "fullname": "Store Manager", "email": "manager@example.com", "role": "admin",
+    "created_at": "2023-05-20T09:12:44.512034Z", "updated_at": "2023-05-20T09:12:44.512034Z",
+    "is_staff": True, "is_superuser": False, "is_active": True, "last_login": "2023-05-24T07:01:12.000000Z",
+    "groups": [], "user_permissions": [],
+  }
+  group = {
+    "id": 3, "created_by": user, "belongs_to": None, "total_items": None, "name": "Beverages",
+    "created_at": "2023-05-21T10:00:00.000000Z", "updated_at": "2023-05-21T10:00:00.000000Z",
+  }
+  results = [
+    {
+      "id": index, "created_by": user, "group": group,
+      "photo": f"http://localhost:8000/media/inventory/photos/{index:032x}.png",
+      "photo_small": f"http://localhost:8000/media/inventory/thumbnails/small/{index:032x}.jpg",
+      "photo_medium": f"http://localhost:8000/media/inventory/thumbnails/medium/{index:032x}.jpg",
+      "total": 500, "remaining": 120 + index, "name": f"Sparkling water 500ml #{index}", "code": f"BOSE{index:06d}",
+      "hot_shards": 0, "price": 1.25 + index / 100,
+      "created_at": "2023-05-22T11:30:00.000000Z", "updated_at": "2023-05-23T08:45:10.000000Z",
+    }
+    for index in range(1, rows + 1)
+  ]
+  return {"count": rows * 10, "next": "http://localhost:8000/app/inventory?page=2", "previous": None, "results": results}
+
+class Command(BaseCommand):
+  '''
+  Compares rendering an inventory list page with DRF's standard JSONRenderer and with FastJSONRenderer, and shows what
+  gzip and brotli compression (as done by CompressionMiddleware) cost and save on the rendered page.
+  '''
+  help = "Benchmark JSON rendering and compression of inventory list pages"
+  
+  def add_arguments(self, parser):
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 1000])
+    parser.add_argument("--repeat", type=int, default=200)
+    
+  def handle(self, *args, **options):
+    if orjson is None:
+      self.stdout.write(self.style.WARNING("orjson is not installed, FastJSONRenderer falls back to the standard renderer"))
+      
+    for rows in options["rows"]:
+      page = sample_page(rows)
+      repeat = max(options["repeat"] * 20 // rows, 5)
+      self.stdout.write(f"\n{rows} rows, {repeat} runs")
+      
+      for name, renderer in (("stdlib json", JSONRenderer()), ("fast json", FastJSONRenderer())):
+        elapsed, body = self.measure(lambda: renderer.render(page, "application/json"), repeat)
+        self.stdout.write(f"  {name:<14} {elapsed * 1000:8.3f} ms  {len(body):>9} bytes")
+        
+      compressors = [("gzip", lambda: gzip.compress(body, compresslevel=settings.GZIP_LEVEL, mtime=0))]
+      if brotli is not None:
+        compressors.append(("brotli", lambda: brotli.compress(body, quality=settings.BROTLI_QUALITY)))
+      for name, compress in compressors:
+        elapsed, compressed = self.measure(compress, repeat)
+        self.stdout.write(f"  {name:<14} {elapsed * 1000:8.3f} ms  {len(compressed):>9} bytes")
+        
+  def measure(self, func, repeat):
+    result = func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+      func()
+    return (time.perf_counter() - started) / repeat, result
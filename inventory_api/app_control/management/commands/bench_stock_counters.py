@@ -0,0 +1,67 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import F
+from app_control.models import Inventory, InventoryStockShard
+
+class Command(BaseCommand):
+  '''
+  Measures how many sales per second concurrent cashiers can record against a single item, once with the single
+  Inventory.remaining counter and once with the stock split over shards.
+  
+  Every sale runs in its own transaction and holds its counter lock for --hold-ms, standing in for the rest of the invoice
+  work done in the same transaction. Run it against PostgreSQL: SQLite serializes all writers and shows no difference.
+  A throw-away item is created for the run and deleted afterwards.
+  '''
+  help = "Benchmark single-row versus sharded stock counters under concurrent sales"
+  
+  def add_arguments(self, parser):
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--sales", type=int, default=200, help="Sales per worker")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--hold-ms", type=float, default=2)
+    
+  def handle(self, *args, **options):
+    workers, sales, hold = options["workers"], options["sales"], options["hold_ms"] / 1000
+    stock = workers * sales * 2
+    # bulk_create skips Inventory.save(), the benchmark item gets no ledger entries or activity log
+    item = Inventory.objects.bulk_create([Inventory(name="stock counter benchmark", total=stock, remaining=stock)])[0]
+    
+    try:
+      def sell_single():
+        with transaction.atomic():
+          Inventory.objects.filter(pk=item.pk, remaining__gte=1).update(remaining=F("remaining") - 1)
+          time.sleep(hold)
+          
+      def sell_sharded():
+        with transaction.atomic():
+          InventoryStockShard.objects.take(item, 1)
+          time.sleep(hold)
+          
+      single = self.run(sell_single, workers, sales)
+      item.enable_hot_mode(shards=options["shards"])
+      sharded = self.run(sell_sharded, workers, sales)
+    finally:
+      Inventory.objects.filter(pk=item.pk).delete()
+      
+    self.stdout.write(f"{workers} workers x {sales} sales, {options['hold_ms']}ms per transaction")
+    self.stdout.write(f"single row:          {single:10.1f} sales/s")
+    self.stdout.write(f"{options['shards']} shards:            {sharded:10.1f} sales/s")
+    self.stdout.write(self.style.SUCCESS(f"speedup: {sharded / single:.2f}x"))
+    
+  def run(self, sell, workers, sales):
+    def worker():
+      try:
+        for _ in range(sales):
+          sell()
+      finally:
+        connection.close()
+        
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+    return workers * sales / (time.perf_counter() - started)
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from app_control.stock import backfill_opening_balances, find_stock_mismatches
+
+class Command(BaseCommand):
+  '''
+  Compares Inventory.remaining (or the stock shards of hot items) with the sum of the stock ledger for every item and lists the items that do not match.
+  Exits with a non-zero status when mismatches are found, so it can be used from monitoring scripts.
+  '''
+  help = "Verify Inventory.remaining against the stock movement ledger"
+  
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--backfill", action="store_true",
+      help="First record an opening balance for items that have no stock movements yet"
+    )
+    
+  def handle(self, *args, **options):
+    if options["backfill"]:
+      count = backfill_opening_balances()
+      self.stdout.write(f"{count} opening balances recorded")
+      
+    mismatches = list(find_stock_mismatches())
+    for item in mismatches:
+      self.stdout.write(
+        f"item {item['id']} ({item['name']}): stock {item['stock']}, ledger {item['ledger_remaining']}"
+      )
+      
+    if mismatches:
+      self.stderr.write(self.style.ERROR(f"{len(mismatches)} items do not match the ledger"))
+      raise SystemExit(1)
+    self.stdout.write(self.style.SUCCESS("Inventory.remaining matches the ledger for all items"))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from app_control.models import Inventory
+
+class Command(BaseCommand):
+  '''
+  Switches an item in or out of hot mode, e.g. before and after a promotion. In hot mode the stock of the item is split over
+  several counter rows so that concurrent sales do not all wait for the lock on the same Inventory row.
+  '''
+  help = "Enable or disable sharded stock counters for an inventory item"
+  
+  def add_arguments(self, parser):
+    parser.add_argument("code", help="Code of the inventory item, e.g. BOSE000012")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--off", action="store_true", help="Fold the shards back into remaining")
+    
+  def handle(self, *args, **options):
+    try:
+      item = Inventory.objects.get(code=options["code"])
+    except Inventory.DoesNotExist:
+      raise CommandError(f"item with code {options['code']} not found")
+    
+    if options["off"]:
+      item.disable_hot_mode()
+      self.stdout.write(self.style.SUCCESS(f"{item.code} is back on a single counter, remaining {item.remaining}"))
+    else:
+      item.enable_hot_mode(shards=options["shards"])
+      self.stdout.write(self.style.SUCCESS(f"{item.code} now keeps its stock in {item.hot_shards} shards"))
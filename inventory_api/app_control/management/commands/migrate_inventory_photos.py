@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from app_control.models import Inventory
+from app_control.photos import decode_base64_image, schedule_thumbnails
+
+class Command(BaseCommand):
+  '''
+  Moves the base64 photos that used to be stored in the Inventory row (legacy_photo) into file storage.
+  
+  Items are processed in batches ordered by id, and only the id and the blob of one batch are loaded at a time, so the
+  command can run against a live table without holding large amounts of data in memory or long running locks.
+  Each batch is written with a single bulk_update, and thumbnails are generated in the background once it has committed.
+  Blobs that cannot be decoded are reported and left in place.
+  '''
+  help = "Move base64 inventory photos out of the database into file storage"
+  
+  def add_arguments(self, parser):
+    parser.add_argument("--batch-size", type=int, default=100)
+    
+  def handle(self, *args, **options):
+    batch_size = options["batch_size"]
+    pending = Inventory.objects.exclude(legacy_photo__isnull=True).exclude(legacy_photo="").order_by("id")
+    last_id = 0
+    moved = 0
+    failed = []
+    
+    while True:
+      batch = list(pending.filter(id__gt=last_id).only("id", "photo", "legacy_photo")[:batch_size])
+      if not batch:
+        break
+      last_id = batch[-1].id
+      
+      migrated = []
+      for item in batch:
+        photo = decode_base64_image(item.legacy_photo)
+        if photo is None:
+          failed.append(item.id)
+          continue
+        item.photo.save(photo.name, photo, save=False)
+        item.legacy_photo = None
+        migrated.append(item)
+        
+      with transaction.atomic():
+        Inventory.objects.bulk_update(migrated, ["photo", "legacy_photo"])
+        for item in migrated:
+          schedule_thumbnails(item.id)
+          
+      moved += len(migrated)
+      self.stdout.write(f"moved {moved} photos (last id {last_id})")
+      
+    if failed:
+      self.stderr.write(f"could not decode the photos of items: {', '.join(str(i) for i in failed)}")
+    self.stdout.write(self.style.SUCCESS(f"Done, {moved} photos moved to file storage"))
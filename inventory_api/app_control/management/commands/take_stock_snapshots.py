@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from app_control.stock import take_snapshots
+
+class Command(BaseCommand):
+  '''
+  Meant to run periodically (e.g. nightly from cron). Only items that had stock movements since the previous run get a new snapshot.
+  '''
+  help = "Write stock snapshots for items that changed since the last snapshot"
+  
+  def handle(self, *args, **options):
+    count = take_snapshots()
+    self.stdout.write(self.style.SUCCESS(f"{count} stock snapshots written"))
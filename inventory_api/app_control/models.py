@@ -1,7 +1,19 @@
+import random
 from typing import Any
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Upper
 from user_control.models import CustomUser
 from user_control.views import add_user_activity
+from .events import item_channels, publish_stock_change
+from .photos import delete_photo_files, schedule_thumbnails
+
+MovementKinds = (("receipt", "receipt"), ("sale", "sale"), ("adjustment", "adjustment"), ("return", "return"))
+
+class InsufficientStock(Exception):
+  '''
+  Raised when a sale or movement would take more stock than the item has, the API answers it with a 400.
+  '''
 
 # Create your models here.
 class InventoryGroup(models.Model):
@@ -13,6 +25,8 @@ class InventoryGroup(models.Model):
   
   class Meta:
     ordering=("-created_at",)
+    # The admin searches names case-insensitively, UPPER(name) is what that lookup compares
+    indexes = [models.Index(fields=("created_at",)), models.Index(Upper("name"), name="inventorygroup_name_upper_idx")]
     
   def __init__(self, *args, **kwargs):
     super().__init__(*args, **kwargs)
@@ -36,32 +50,83 @@ class InventoryGroup(models.Model):
   
 class Inventory(models.Model):
   created_by = models.ForeignKey(CustomUser, null=True, related_name="inventory_items", on_delete=models.SET_NULL)
-  photo = models.TextField(blank=True, null=True)
+  # Only the storage path is kept in the row, the image itself lives in MEDIA_ROOT (see photos.py)
+  photo = models.ImageField(upload_to="inventory/photos/", max_length=255, blank=True, null=True, db_column="photo_path")
+  photo_small = models.ImageField(upload_to="inventory/thumbnails/small/", max_length=255, blank=True, null=True, editable=False)
+  photo_medium = models.ImageField(upload_to="inventory/thumbnails/medium/", max_length=255, blank=True, null=True, editable=False)
+  # Base64 blobs saved before photos moved to file storage, emptied by the migrate_inventory_photos command
+  legacy_photo = models.TextField(blank=True, null=True, editable=False, db_column="photo")
   group = models.ForeignKey(InventoryGroup, related_name="inventories", null=True, on_delete=models.SET_NULL)
   total = models.PositiveIntegerField()
   remaining = models.PositiveIntegerField(null=True)
   name = models.CharField(max_length=255)
+  code = models.CharField(max_length=20, unique=True, null=True, editable=False)
+  # Number of InventoryStockShard rows holding the stock of a hot item, 0 means remaining is the stock (see enable_hot_mode)
+  hot_shards = models.PositiveSmallIntegerField(default=0, editable=False)
   price = models.FloatField(default=0)
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
   
   class Meta:
     ordering = ("-created_at",)
+    # Columns that list views can filter on (see InventoryFilter), created_at also serves the default ordering
+    indexes = [
+      models.Index(fields=("created_at",)),
+      models.Index(fields=("price",)),
+      models.Index(fields=("remaining",)),
+      models.Index(Upper("name"), name="inventory_name_upper_idx"),
+      models.Index(Upper("code"), name="inventory_code_upper_idx"),
+    ]
+    
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    # Avoid loading a deferred column just to remember its value. A photo that has not been uploaded yet (a new item
+    # created with a photo) is not an old photo, its name changes when the upload saves it
+    photo_stored = "photo" not in self.get_deferred_fields() and self.photo._committed
+    self.old_photo = self.photo.name if photo_stored else None
     
+  # Stock only changes through the ledger (stock.record_movement, sales, stock takes) with conditional UPDATEs of these
+  # columns, a save must never write back the values an item was read with
+  stock_fields = ("total", "remaining", "hot_shards", "code")
+  
   def save(self, *args, **kwargs):
     is_new = self.pk is None
     
     if is_new:
       self.remaining = self.total
+    elif kwargs.get("update_fields") is None:
+      deferred = self.get_deferred_fields()
+      kwargs["update_fields"] = [
+        field.name for field in self._meta.concrete_fields
+        if not field.primary_key and field.attname not in deferred and field.name not in self.stock_fields
+      ]
     
-    super().save(*args, **kwargs)
+    photo_changed = "photo" not in self.get_deferred_fields() and (
+      self.photo.name != self.old_photo or not self.photo._committed
+    )
+    if photo_changed:
+      stale_files = [self.old_photo, self.photo_small.name, self.photo_medium.name]
+      self.photo_small = None
+      self.photo_medium = None
+    
+    with transaction.atomic():
+      super().save(*args, **kwargs)
+      if is_new:
+        # The stock history of every item starts with the quantity it was received with
+        StockMovement.objects.create(item=self, kind="receipt", quantity=self.total, created_by=self.created_by)
+    
+    if photo_changed:
+      delete_photo_files(stale_files)
+      self.old_photo = self.photo.name
+      if self.photo:
+        schedule_thumbnails(self.id)
     
     if is_new:
       id_length = len(str(self.id))
       code_length = 6 - id_length
       zeros = ''.join("0" for i in range(code_length))
       self.code = f"BOSE{zeros}{self.id}"
-      self.save()
+      Inventory.objects.filter(pk=self.pk).update(code=self.code)
     
     action = f"added new inventory item with code - '{self.code}'"
     
@@ -69,11 +134,87 @@ class Inventory(models.Model):
       action = f"updated inventory item with code - '{self.code}'"
     
     add_user_activity(self.created_by, action=action)
+    if not is_new:
+      # A save does not write the stock, the instance may hold an older value than the row
+      self.refresh_stock()
+    publish_stock_change(self, item_channels(self))
+    
+  def change_stock(self, quantity):
+    '''
+    Adds quantity (negative to take stock out) with a single conditional UPDATE, so that concurrent changes cannot
+    overwrite each other. Whether the item is hot is read from the row, not from the instance, which may have been read
+    before hot mode was switched on or off: the UPDATE only matches an item that is not hot, and hot items use their shards.
+    '''
+    single_counter = Inventory.objects.filter(pk=self.pk, hot_shards=0, remaining__gte=max(-quantity, 0))
+    if single_counter.update(remaining=F("remaining") + quantity):
+      self.hot_shards = 0
+      return
+    
+    self.hot_shards = Inventory.objects.values_list("hot_shards", flat=True).get(pk=self.pk)
+    if not self.hot_shards:
+      raise InsufficientStock(f"item with code {self.code} does not have enough quantity")
+    if quantity < 0:
+      InventoryStockShard.objects.take(self, -quantity)
+    else:
+      InventoryStockShard.objects.give(self, quantity)
+    
+  def refresh_stock(self):
+    '''
+    Re-reads the stock of the item after it was changed with a conditional UPDATE, which leaves the instance untouched.
+    Stock events must carry the value of the row, not the one the instance was read with.
+    '''
+    self.refresh_from_db(fields=["remaining", "hot_shards"])
+    self.__dict__.pop("shard_remaining", None)
+    
+  @property
+  def stock_remaining(self):
+    '''
+    The available stock of the item. For hot items this is the sum of the shards, which InventoryView annotates
+    as shard_remaining so that it does not have to be queried per item.
+    '''
+    if not self.hot_shards:
+      return self.remaining
+    if hasattr(self, "shard_remaining"):
+      return self.shard_remaining
+    return self.stock_shards.aggregate(total=Sum("remaining"))["total"] or 0
+  
+  def enable_hot_mode(self, shards=8):
+    '''
+    Spreads the remaining stock of the item over several counter rows. Every sale then only locks one of them instead of
+    the Inventory row, so concurrent sales of the same item no longer wait for each other.
+    '''
+    with transaction.atomic():
+      item = Inventory.objects.select_for_update().get(pk=self.pk)
+      if item.hot_shards:
+        return
+      base, extra = divmod(item.remaining, shards)
+      InventoryStockShard.objects.bulk_create([
+        InventoryStockShard(item=item, shard=index, remaining=base + (1 if index < extra else 0)) for index in range(shards)
+      ])
+      Inventory.objects.filter(pk=self.pk).update(hot_shards=shards)
+    self.hot_shards = shards
+    
+  def disable_hot_mode(self):
+    '''
+    Folds the shards back into remaining.
+    '''
+    with transaction.atomic():
+      item = Inventory.objects.select_for_update().get(pk=self.pk)
+      if not item.hot_shards:
+        return
+      shards = InventoryStockShard.objects.select_for_update().filter(item=item)
+      remaining = sum(shard.remaining for shard in shards)
+      shards.delete()
+      Inventory.objects.filter(pk=self.pk).update(remaining=remaining, hot_shards=0)
+    self.remaining = remaining
+    self.hot_shards = 0
     
   def delete(self, *args, **kwargs):
     created_by = self.created_by
     action = f"deleted inventory - '{self.code}'"
+    photo_files = [self.photo.name, self.photo_small.name, self.photo_medium.name]
     super().delete(*args, **kwargs)
+    delete_photo_files(photo_files)
     add_user_activity(created_by, action=action)
     
   def __str__(self):
@@ -87,6 +228,8 @@ class Shop(models.Model):
   
   class Meta:
     ordering=("-created_at",)
+    # The admin searches names case-insensitively, UPPER(name) is what that lookup compares
+    indexes = [models.Index(fields=("created_at",)), models.Index(Upper("name"), name="shop_name_upper_idx")]
     
   def __init__(self, *args, **kwargs):
     super().__init__(*args, **kwargs)
@@ -140,17 +283,136 @@ class InvoiceItem(models.Model):
     ordering = ("-created_at", )
     
   def save(self, *args, **kwargs):
-    if self.item.remaining < self.quantity:
-      raise Exception(f"item with code {self.item.code} does not have enough quantity")
+    # Stock is only taken out when the invoice item is first created, saving it again must not sell the items twice
+    if self.pk is not None:
+      return super().save(*args, **kwargs)
     
     self.item_name = self.item.name
     self.item_code = self.item_code
-    
     self.amount = self.quantity * self.item.price
-    self.item.remaining = self.item.remaining - self.quantity
-    self.item.save()
     
+    with transaction.atomic():
+      self.item.change_stock(-self.quantity)
+      super().save(*args, **kwargs)
+      self.item.refresh_stock()
+      channels = item_channels(self.item)
+      if self.invoice.shop_id is not None:
+        channels.append(f"shop:{self.invoice.shop_id}")
+      publish_stock_change(self.item, channels)
+      StockMovement.objects.create(
+        item=self.item, kind="sale", quantity=-self.quantity, invoice_item=self, created_by=self.invoice.created_by
+      )
+    
+  def __str__(self):
+    return f"{self.item.code} - {self.quantity}"
+    
+class StockMovementQuerySet(models.QuerySet):
+  '''
+  The ledger is append-only, rows are never changed or removed once they have been written.
+  '''
+  def update(self, **kwargs):
+    raise Exception("stock movements are append-only and cannot be updated")
+  
+  def delete(self):
+    raise Exception("stock movements are append-only and cannot be deleted")
+    
+class StockMovement(models.Model):
+  '''
+  Every change to the stock of an item is recorded as a new row: receipts and returns add stock (positive quantity),
+  sales remove it (negative quantity) and adjustments go either way. The sum of the movements of an item is its stock,
+  and it has to match Inventory.remaining (see stock.find_stock_mismatches).
+  '''
+  item = models.ForeignKey(Inventory, null=True, related_name="stock_movements", on_delete=models.SET_NULL)
+  kind = models.CharField(max_length=10, choices=MovementKinds)
+  quantity = models.IntegerField()
+  invoice_item = models.ForeignKey(InvoiceItem, null=True, related_name="stock_movements", on_delete=models.SET_NULL)
+  created_by = models.ForeignKey(CustomUser, null=True, related_name="stock_movements", on_delete=models.SET_NULL)
+  note = models.CharField(max_length=255, blank=True, default="")
+  created_at = models.DateTimeField(auto_now_add=True)
+  
+  objects = StockMovementQuerySet.as_manager()
+  
+  class Meta:
+    ordering = ("-created_at", )
+    # created_at alone serves the windows of the snapshot runs (see stock.take_snapshots)
+    indexes = [models.Index(fields=("item", "created_at")), models.Index(fields=("created_at", ))]
+    
+  def save(self, *args, **kwargs):
+    if self.pk is not None:
+      raise Exception("stock movements are append-only and cannot be updated")
     super().save(*args, **kwargs)
     
+  def delete(self, *args, **kwargs):
+    raise Exception("stock movements are append-only and cannot be deleted")
+    
+  def __str__(self):
+    return f"{self.kind} {self.quantity} of item {self.item_id}"
+  
+class StockSnapshot(models.Model):
+  '''
+  The stock of an item after all movements created before taken_at. Stock at any point in time is the latest snapshot
+  taken before it plus the movements created since, instead of a replay of the whole ledger.
+  '''
+  item = models.ForeignKey(Inventory, related_name="stock_snapshots", on_delete=models.CASCADE)
+  quantity = models.IntegerField()
+  taken_at = models.DateTimeField()
+  
+  class Meta:
+    ordering = ("-taken_at", )
+    indexes = [models.Index(fields=("item", "taken_at"))]
+    
+  def __str__(self):
+    return f"{self.item_id} - {self.quantity} on {self.taken_at.strftime('%Y-%m-%d %H-%M')}"
+    
+class StockShardQuerySet(models.QuerySet):
+  # Shards are rebalanced once one of them drops below this, so sales keep finding a shard that can cover them
+  low_watermark = 5
+  
+  def take(self, item, quantity):
+    '''
+    Takes the quantity from a randomly chosen shard that has enough stock, with a conditional UPDATE that only locks that shard.
+    When no single shard can cover the quantity, all shards are locked and rebalanced first.
+    '''
+    for shard in random.sample(range(item.hot_shards), item.hot_shards):
+      shards = self.filter(item=item, shard=shard, remaining__gte=quantity)
+      if shards.update(remaining=F("remaining") - quantity):
+        if self.model.objects.filter(item=item, shard=shard, remaining__lt=self.low_watermark).exists():
+          transaction.on_commit(lambda: self.model.objects.rebalance(item, skip_locked=True))
+        return
+    self.rebalance(item, take=quantity)
+    
+  def give(self, item, quantity):
+    self.filter(item=item, shard=random.randrange(item.hot_shards)).update(remaining=F("remaining") + quantity)
+    
+  def rebalance(self, item, take=0, skip_locked=False):
+    '''
+    Spreads the stock evenly over the shards of the item, after taking out the given quantity.
+    With skip_locked, shards that are busy in other transactions are left out instead of waited for.
+    '''
+    with transaction.atomic():
+      shards = list(self.select_for_update(skip_locked=skip_locked).filter(item=item).order_by("shard"))
+      if not shards and skip_locked:
+        return
+      total = sum(shard.remaining for shard in shards) - take
+      if not shards or total < 0:
+        raise InsufficientStock(f"item with code {item.code} does not have enough quantity")
+      base, extra = divmod(total, len(shards))
+      for index, shard in enumerate(shards):
+        shard.remaining = base + (1 if index < extra else 0)
+      self.model.objects.bulk_update(shards, ["remaining"])
+      
+class InventoryStockShard(models.Model):
+  '''
+  One slice of the stock of a hot item. The available stock of the item is the sum of its shards.
+  '''
+  item = models.ForeignKey(Inventory, related_name="stock_shards", on_delete=models.CASCADE)
+  shard = models.PositiveSmallIntegerField()
+  remaining = models.PositiveIntegerField()
+  
+  objects = StockShardQuerySet.as_manager()
+  
+  class Meta:
+    constraints = [models.UniqueConstraint(fields=("item", "shard"), name="unique_item_stock_shard")]
+    
   def __str__(self):
-    return f"{self.item.code} - {self.quantity}"
\ No newline at end of file
+    return f"{self.item_id} shard {self.shard} - {self.remaining}"
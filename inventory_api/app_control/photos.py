@@ -0,0 +1,95 @@
+import base64
+import binascii
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+'''
+Inventory photos are stored through Django's storage API (the local filesystem by default, see MEDIA_ROOT in settings)
+and only the file path is kept on the Inventory row. This keeps the row narrow, so list queries never read image bytes.
+
+Thumbnails are generated off the request path: schedule_thumbnails() waits for the surrounding transaction to commit and then
+hands the work to a small background thread pool, or queues a job for the job workers when THUMBNAILS_USE_JOB_QUEUE is set. The thumbnail columns are written with a queryset update() so that
+Inventory.save() (and its activity log entry) is not triggered a second time.
+'''
+
+# Field name on Inventory -> bounding box of the generated thumbnail
+THUMBNAIL_SIZES = {
+  "photo_small": (128, 128),
+  "photo_medium": (512, 512),
+}
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="inventory-thumbnails")
+
+def decode_base64_image(data):
+  '''
+  Turns a base64 string (optionally a data URI such as "data:image/png;base64,....") into a ContentFile with a random name
+  and an extension matching the actual image format. Returns None when the data is not a readable image.
+  '''
+  if data.startswith("data:") and ";base64," in data:
+    data = data.split(";base64,", 1)[1]
+
+  try:
+    decoded = base64.b64decode(data, validate=True)
+    image_format = Image.open(BytesIO(decoded)).format
+  except (binascii.Error, ValueError, UnidentifiedImageError):
+    return None
+
+  extension = "jpg" if image_format == "JPEG" else image_format.lower()
+  return ContentFile(decoded, name=f"{uuid.uuid4().hex}.{extension}")
+
+def schedule_thumbnails(inventory_id):
+  if settings.THUMBNAILS_USE_JOB_QUEUE:
+    from job_control.queue import enqueue
+    enqueue("app_control.generate_thumbnails", {"inventory_id": inventory_id})
+    return
+  transaction.on_commit(lambda: _executor.submit(generate_thumbnails, inventory_id))
+
+def delete_photo_files(names):
+  '''
+  Removes photos and thumbnails that are no longer referenced, once the transaction that replaced them has committed.
+  '''
+  names = [name for name in names if name]
+  if names:
+    transaction.on_commit(lambda: [default_storage.delete(name) for name in names])
+
+def generate_thumbnails(inventory_id):
+  from .models import Inventory
+
+  try:
+    item = Inventory.objects.filter(id=inventory_id).only("id", "photo", "photo_small", "photo_medium").first()
+    if item is None or not item.photo:
+      return
+
+    with item.photo.open("rb") as photo_file:
+      image = Image.open(photo_file)
+      image.load()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "L"):
+      image = image.convert("RGB")
+
+    base_name = os.path.splitext(os.path.basename(item.photo.name))[0]
+    updates = {}
+    for field_name, size in THUMBNAIL_SIZES.items():
+      thumbnail = image.copy()
+      thumbnail.thumbnail(size)
+      buffer = BytesIO()
+      thumbnail.save(buffer, format="JPEG", quality=85)
+
+      field = getattr(item, field_name)
+      if field:
+        field.delete(save=False)
+      field.save(f"{base_name}.jpg", ContentFile(buffer.getvalue()), save=False)
+      updates[field_name] = field.name
+
+    # Only store the thumbnails if the photo was not replaced while they were being generated
+    Inventory.objects.filter(id=item.id, photo=item.photo.name).update(**updates)
+  finally:
+    # This runs in a pool thread, which holds its own database connection
+    connection.close()
@@ -1,5 +1,7 @@
-from .models import Inventory, InventoryGroup, Shop
+from .models import Inventory, InventoryGroup, Shop, StockMovement
+from .photos import decode_base64_image
 from user_control.serializers import CustomUserSerializer
+from django.conf import settings
 from rest_framework import serializers
 
 '''
@@ -49,15 +51,45 @@ class InventoryGroupSerializer(serializers.ModelSerializer):
       return InventoryGroupSerializer(obj.belongs_to).data
     return None
 
+class Base64ImageField(serializers.ImageField):
+  '''
+  Accepts either a regular file upload or a base64 encoded image (what the frontend sends), and stores it as a file.
+  When the data is read, the field returns the URL of the stored file instead of its content.
+  '''
+  def to_internal_value(self, data):
+    if isinstance(data, str):
+      data = decode_base64_image(data)
+      if data is None:
+        self.fail("invalid_image")
+    return super().to_internal_value(data)
+
 class InventorySerializer(serializers.ModelSerializer):
   created_by = CustomUserSerializer(read_only=True)
   created_by_id = serializers.CharField(write_only=True, required=False)
   group = InventoryGroupSerializer(read_only=True)
   group_id = serializers.CharField(write_only=True)
+  # photo, photo_small and photo_medium are all returned as URLs, the thumbnails are filled in once they have been generated
+  photo = Base64ImageField(required=False, allow_null=True)
   
   class Meta:
     model = Inventory
-    fiels = "__all__"
+    # legacy_photo holds the old base64 blobs and is never sent to the client
+    exclude = ("legacy_photo", )
+    # Stock changes go through the ledger (see stock.py), remaining starts at total when the item is created
+    read_only_fields = ("remaining", )
+    
+  def get_fields(self):
+    fields = super().get_fields()
+    # total is the quantity the item was received with, it cannot be changed afterwards
+    if isinstance(self.instance, Inventory):
+      fields["total"].read_only = True
+    return fields
+    
+  def to_representation(self, instance):
+    data = super().to_representation(instance)
+    # For hot items the remaining column is not kept up to date, their stock is the sum of the shards
+    data["remaining"] = instance.stock_remaining
+    return data
     
 class ShopSerializer(serializers.ModelSerializer):
   created_by = CustomUserSerializer(read_only=True)
@@ -67,4 +99,50 @@ class ShopSerializer(serializers.ModelSerializer):
   
   class Meta:
     model = Shop
-    fields = "__all__"
\ No newline at end of file
+    fields = "__all__"
+    
+class StockTakeLinesField(serializers.Field):
+  '''
+  The lines of a count sheet as [code, counted quantity] pairs. A sheet can have 100k lines, so they are checked in one
+  loop instead of with a nested serializer per line.
+  '''
+  def to_internal_value(self, data):
+    if not isinstance(data, list) or not data:
+      raise serializers.ValidationError("expected a list of [code, quantity] pairs")
+    if len(data) > settings.STOCK_TAKE_MAX_LINES:
+      raise serializers.ValidationError(f"a stock take can have at most {settings.STOCK_TAKE_MAX_LINES} lines")
+    
+    lines = []
+    for number, line in enumerate(data, 1):
+      if not isinstance(line, list) or len(line) != 2:
+        raise serializers.ValidationError(f"line {number} is not a [code, quantity] pair")
+      code, counted = line
+      if not isinstance(code, str) or not 0 < len(code) <= 20:
+        raise serializers.ValidationError(f"line {number} has an invalid code")
+      if type(counted) is not int or counted < 0:
+        raise serializers.ValidationError(f"line {number} has an invalid quantity, it must be 0 or more")
+      lines.append((code, counted))
+    return lines
+  
+class StockTakeSerializer(serializers.Serializer):
+  lines = StockTakeLinesField()
+  apply = serializers.BooleanField(default=False, required=False)
+  
+class StockMovementSerializer(serializers.ModelSerializer):
+  '''
+  Receipts, returns and adjustments recorded through the API. Sales are only recorded by invoices.
+  '''
+  kind = serializers.ChoiceField(("receipt", "return", "adjustment"))
+  
+  class Meta:
+    model = StockMovement
+    fields = ("id", "item", "kind", "quantity", "note", "created_by", "created_at")
+    read_only_fields = ("item", "created_by")
+    
+  def validate(self, data):
+    # quantity is signed, only adjustments may remove stock
+    if data["kind"] in ("receipt", "return") and data["quantity"] <= 0:
+      raise serializers.ValidationError({"quantity": f"a {data['kind']} must add stock, the quantity has to be positive"})
+    if data["quantity"] == 0:
+      raise serializers.ValidationError({"quantity": "the quantity cannot be 0"})
+    return data
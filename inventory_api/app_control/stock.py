@@ -0,0 +1,129 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .events import item_channels, publish_stock_change
+from .models import InsufficientStock, Inventory, InventoryStockShard, StockMovement, StockSnapshot
+
+'''
+Helpers around the stock ledger (StockMovement) and its periodic snapshots (StockSnapshot).
+
+Inventory.remaining stays the fast counter used by the API, the ledger is the history behind it. Both are always written in the
+same transaction, and find_stock_mismatches() verifies that they agree.
+'''
+
+def record_movement(item, kind, quantity, user=None, note=""):
+  '''
+  Records a receipt, return or adjustment for an item and applies it to its stock (see Inventory.change_stock).
+  quantity is signed: positive values add stock, negative values remove it.
+  '''
+  with transaction.atomic():
+    item.change_stock(quantity)
+    item.refresh_stock()
+    publish_stock_change(item, item_channels(item))
+    return StockMovement.objects.create(item=item, kind=kind, quantity=quantity, created_by=user, note=note)
+
+def snapshot_safe_point():
+  '''
+  A time before which every stock movement has committed. A movement is stamped with created_at when it is written, but
+  only becomes visible when its transaction commits, which can be much later (a long stock take, for instance). Movements
+  created before the start of the oldest transaction that is still writing have all committed. The margin of
+  STOCK_SNAPSHOT_SAFETY_SECONDS covers the clock difference between the web servers and the database.
+  '''
+  safe_point = timezone.now()
+  if connection.vendor == "postgresql":
+    with connection.cursor() as cursor:
+      cursor.execute(
+        "SELECT MIN(xact_start) FROM pg_stat_activity WHERE backend_xid IS NOT NULL AND pid <> pg_backend_pid()"
+      )
+      oldest_transaction = cursor.fetchone()[0]
+    if oldest_transaction is not None:
+      safe_point = min(safe_point, oldest_transaction)
+  return safe_point - timedelta(seconds=settings.STOCK_SNAPSHOT_SAFETY_SECONDS)
+
+def take_snapshots():
+  '''
+  Writes a snapshot for every item that has had movements since the previous run, taken at the safe point (see
+  snapshot_safe_point) so that no movement still being committed can fall between two runs.
+  The new quantity is the previous snapshot plus the movements in between, computed with one grouped query.
+  Returns the number of snapshots written.
+  '''
+  taken_at = snapshot_safe_point()
+  previous_run = StockSnapshot.objects.aggregate(last=Max("taken_at"))["last"]
+  if previous_run is not None and previous_run >= taken_at:
+    return 0
+
+  movements = StockMovement.objects.filter(item__isnull=False, created_at__lt=taken_at)
+  if previous_run is not None:
+    movements = movements.filter(created_at__gte=previous_run)
+  latest_snapshot = StockSnapshot.objects.filter(item=OuterRef("item")).order_by("-taken_at")
+  changes = (
+    movements.order_by()
+    .values("item")
+    .annotate(delta=Sum("quantity"), previous=Subquery(latest_snapshot.values("quantity")[:1]))
+  )
+
+  snapshots = [
+    StockSnapshot(item_id=change["item"], quantity=(change["previous"] or 0) + change["delta"], taken_at=taken_at)
+    for change in changes
+  ]
+  StockSnapshot.objects.bulk_create(snapshots, batch_size=1000)
+  return len(snapshots)
+
+def stock_at(item, when):
+  '''
+  Returns the stock of an item at the given time: the latest snapshot taken before it plus the movements created since.
+  '''
+  snapshot = item.stock_snapshots.filter(taken_at__lte=when).order_by("-taken_at").first()
+  movements = item.stock_movements.filter(created_at__lte=when)
+  quantity = 0
+
+  if snapshot is not None:
+    quantity = snapshot.quantity
+    movements = movements.filter(created_at__gte=snapshot.taken_at)
+
+  return quantity + (movements.aggregate(total=Sum("quantity"))["total"] or 0)
+
+def shard_total():
+  '''
+  The sum of the stock shards of the Inventory row in the outer query, for annotating querysets.
+  '''
+  shards = InventoryStockShard.objects.filter(item=OuterRef("pk")).order_by().values("item")
+  return Subquery(shards.annotate(total=Sum("remaining")).values("total"))
+
+def find_stock_mismatches():
+  '''
+  Returns the items whose stock (remaining, or the sum of the shards for hot items) does not match the sum of their ledger,
+  checked for all items in one query.
+  '''
+  ledger_total = (
+    StockMovement.objects.filter(item=OuterRef("pk"))
+    .order_by()
+    .values("item")
+    .annotate(total=Sum("quantity"))
+    .values("total")
+  )
+  return (
+    Inventory.objects.annotate(
+      ledger_remaining=Coalesce(Subquery(ledger_total), 0),
+      stock=Case(When(hot_shards__gt=0, then=Coalesce(shard_total(), 0)), default=F("remaining"))
+    )
+    .exclude(stock=F("ledger_remaining"))
+    .order_by("id")
+    .values("id", "name", "stock", "ledger_remaining")
+  )
+
+def backfill_opening_balances(user=None):
+  '''
+  Items created before the ledger existed have no movements at all. This gives each of them an opening adjustment equal
+  to its current remaining counter, so that the consistency check only reports real differences.
+  '''
+  items = Inventory.objects.filter(stock_movements__isnull=True, remaining__gt=0).values_list("id", "remaining")
+  movements = [
+    StockMovement(item_id=item_id, kind="adjustment", quantity=remaining, created_by=user, note="opening balance")
+    for item_id, remaining in items
+  ]
+  StockMovement.objects.bulk_create(movements, batch_size=1000)
+  return len(movements)
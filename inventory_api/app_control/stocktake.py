@@ -0,0 +1,137 @@
+import csv
+import io
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from user_control.views import add_user_activity
+from .events import item_channels, publish_stock_change
+from .models import Inventory, InventoryStockShard, StockMovement
+from .stock import record_movement
+
+'''
+Stock takes: a physical count sheet of (code, counted quantity) lines compared with the stock of the items, and optionally
+applied to it.
+
+The lines are bulk loaded into a temporary staging table (with COPY on PostgreSQL), and the whole sheet is compared with
+the inventory in one join, so the cost does not grow with a query per line. Lines with the same code are added up, as an
+item may be counted on several shelves.
+'''
+
+STAGING_TABLE = "stocktake_lines"
+
+COUNTS_SQL = f"SELECT UPPER(code) AS code, SUM(counted) AS counted FROM {STAGING_TABLE} GROUP BY UPPER(code)"
+
+def create_staging_table(cursor):
+  # On PostgreSQL the table goes away with the transaction, elsewhere it is dropped at the end of reconcile_stock_take
+  on_commit = " ON COMMIT DROP" if connection.vendor == "postgresql" else ""
+  cursor.execute(f"CREATE TEMPORARY TABLE {STAGING_TABLE} (code varchar(20) NOT NULL, counted integer NOT NULL){on_commit}")
+
+def load_staging_table(cursor, lines):
+  if connection.vendor == "postgresql":
+    data = io.StringIO()
+    csv.writer(data).writerows(lines)
+    data.seek(0)
+    cursor.copy_expert(f"COPY {STAGING_TABLE} (code, counted) FROM STDIN WITH (FORMAT csv)", data)
+  else:
+    cursor.executemany(f"INSERT INTO {STAGING_TABLE} (code, counted) VALUES (%s, %s)", lines)
+
+def table(model):
+  return connection.ops.quote_name(model._meta.db_table)
+
+def variance_sql():
+  inventory, shards = table(Inventory), table(InventoryStockShard)
+  # Hot items keep their stock in shards, the same as Inventory.stock_remaining
+  return f'''
+    SELECT * FROM (
+      SELECT counts.code, counts.counted, item.id, item.name, item.price, item.group_id, item.hot_shards,
+        CASE
+          WHEN item.hot_shards > 0 THEN COALESCE((SELECT SUM(shard.remaining) FROM {shards} shard WHERE shard.item_id = item.id), 0)
+          ELSE item.remaining
+        END AS expected
+      FROM ({COUNTS_SQL}) counts
+      LEFT JOIN {inventory} item ON UPPER(item.code) = counts.code
+    ) lines
+    WHERE id IS NULL OR expected <> counted
+    ORDER BY code
+  '''
+
+def apply_sql():
+  inventory = table(Inventory)
+  return f'''
+    UPDATE {inventory} SET remaining = counts.counted, updated_at = %s
+    FROM ({COUNTS_SQL}) counts
+    WHERE UPPER({inventory}.code) = counts.code AND {inventory}.hot_shards = 0 AND {inventory}.remaining <> counts.counted
+  '''
+
+def reconcile_stock_take(lines, apply=False, user=None):
+  '''
+  Compares the counted quantities with the stock of the items and returns the variance report: the items whose count
+  differs from their stock, and the codes that match no item.
+
+  With apply, the stock of every item that differs is set to its count in the same transaction: one UPDATE for all of
+  them, an adjustment movement per item for the ledger and a single entry in the activities of the user. The counted
+  items are locked first, so no sale can change them between the comparison and the update.
+  '''
+  with transaction.atomic(), connection.cursor() as cursor:
+    create_staging_table(cursor)
+    try:
+      load_staging_table(cursor, lines)
+      if apply:
+        counted_items = RawSQL(f"SELECT item.id FROM {table(Inventory)} item JOIN ({COUNTS_SQL}) counts ON UPPER(item.code) = counts.code", ())
+        list(Inventory.objects.select_for_update().filter(id__in=counted_items).order_by("id").values_list("id"))
+        list(InventoryStockShard.objects.select_for_update().filter(item_id__in=counted_items).order_by("id").values_list("id"))
+
+      cursor.execute(variance_sql())
+      columns = [column[0] for column in cursor.description]
+      rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+      cursor.execute(f"SELECT COUNT(DISTINCT UPPER(code)) FROM {STAGING_TABLE}")
+      codes = cursor.fetchone()[0]
+
+      # The counts are grouped on the upper-cased code, unknown codes are reported the way they were submitted
+      unknown = {row["code"] for row in rows if row["id"] is None}
+      submitted = {}
+      for code, _ in lines if unknown else ():
+        submitted.setdefault(code.upper(), code)
+      unknown_codes = [submitted.get(code, code) for code in sorted(unknown)]
+      discrepancies = [
+        {
+          "id": row["id"], "code": row["code"], "name": row["name"],
+          "expected": row["expected"], "counted": row["counted"], "variance": row["counted"] - row["expected"]
+        }
+        for row in rows if row["id"] is not None
+      ]
+
+      if apply and discrepancies:
+        apply_corrections(cursor, rows, user)
+        add_user_activity(user, f"applied a stock take of {len(lines)} lines, {len(discrepancies)} items adjusted")
+    finally:
+      if connection.vendor != "postgresql":
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+
+  return {
+    "lines": len(lines),
+    "items_counted": codes - len(unknown_codes),
+    "applied": apply and bool(discrepancies),
+    "discrepancies": discrepancies,
+    "unknown_codes": unknown_codes,
+  }
+
+def apply_corrections(cursor, rows, user):
+  rows = [row for row in rows if row["id"] is not None]
+  cursor.execute(apply_sql(), [timezone.now()])
+
+  movements = [
+    StockMovement(
+      item_id=row["id"], kind="adjustment", quantity=row["counted"] - row["expected"], created_by=user, note="stock take"
+    )
+    for row in rows if not row["hot_shards"]
+  ]
+  StockMovement.objects.bulk_create(movements, batch_size=1000)
+
+  for row in rows:
+    if row["hot_shards"]:
+      # Few items are hot, their shards are adjusted one item at a time
+      record_movement(Inventory.objects.get(id=row["id"]), "adjustment", row["counted"] - row["expected"], user, "stock take")
+    else:
+      item = Inventory(id=row["id"], remaining=row["counted"], price=row["price"], group_id=row["group_id"])
+      publish_stock_change(item, item_channels(item))
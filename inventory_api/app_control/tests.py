@@ -1,3 +1,243 @@
-from django.test import TestCase
+import tempfile
+from io import BytesIO
+from unittest import mock
+from datetime import timedelta
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIRequestFactory
+from inventory_api.utils import get_access_token
+from user_control.models import CustomUser
+from .filters import InventoryFilter
+from .models import Inventory, Invoice, InvoiceItem, StockMovement, StockSnapshot
+from .serializers import InventorySerializer, StockTakeSerializer
+from .stock import find_stock_mismatches, record_movement, stock_at, take_snapshots
+from .stocktake import reconcile_stock_take
+from .views import InventoryView
 
 # Create your tests here.
+def png_file(name="photo.png"):
+  data = BytesIO()
+  Image.new("RGB", (4, 4)).save(data, "PNG")
+  return ContentFile(data.getvalue(), name=name)
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), THUMBNAILS_USE_JOB_QUEUE=False)
+class InventoryPhotoTests(TestCase):
+  def setUp(self):
+    self.user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    
+  @mock.patch("app_control.models.schedule_thumbnails")
+  def test_thumbnails_are_scheduled_for_an_item_created_with_a_photo(self, schedule_thumbnails):
+    item = Inventory.objects.create(name="Item", total=1, created_by=self.user, photo=png_file())
+    
+    schedule_thumbnails.assert_called_once_with(item.id)
+    self.assertTrue(item.photo.name.startswith("inventory/photos/"))
+    self.assertEqual(item.old_photo, item.photo.name)
+    
+  @mock.patch("app_control.models.schedule_thumbnails")
+  def test_thumbnails_are_not_scheduled_again_when_the_photo_is_unchanged(self, schedule_thumbnails):
+    item = Inventory.objects.create(name="Item", total=1, created_by=self.user, photo=png_file())
+    item = Inventory.objects.get(id=item.id)
+    item.name = "Renamed"
+    item.save()
+    
+    schedule_thumbnails.assert_called_once()
+    
+class InventoryStockTests(TestCase):
+  def setUp(self):
+    self.user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    self.item = Inventory.objects.create(name="Item", total=10, created_by=self.user)
+    
+  def test_stock_cannot_be_changed_through_the_serializer(self):
+    serializer = InventorySerializer(self.item, data={"remaining": 3, "total": 3}, partial=True)
+    serializer.is_valid(raise_exception=True)
+    serializer.save()
+    
+    self.item.refresh_from_db()
+    self.assertEqual((self.item.total, self.item.remaining), (10, 10))
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  def test_saving_a_stale_item_keeps_the_current_stock(self):
+    stale = Inventory.objects.get(id=self.item.id)
+    record_movement(self.item, "adjustment", -4, self.user)
+    stale.name = "Renamed"
+    stale.save()
+    
+    stale.refresh_from_db()
+    self.assertEqual((stale.name, stale.remaining), ("Renamed", 6))
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  def test_sales_of_stale_items_take_the_stock_once_each(self):
+    invoice = Invoice.objects.create(created_by=self.user)
+    first, second = Inventory.objects.get(id=self.item.id), Inventory.objects.get(id=self.item.id)
+    InvoiceItem.objects.create(invoice=invoice, item=first, quantity=1)
+    InvoiceItem.objects.create(invoice=invoice, item=second, quantity=2)
+    
+    self.item.refresh_from_db()
+    self.assertEqual(self.item.remaining, 7)
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  def test_sale_of_an_item_made_hot_in_the_meantime_uses_the_shards(self):
+    stale = Inventory.objects.get(id=self.item.id)
+    self.item.enable_hot_mode(shards=2)
+    InvoiceItem.objects.create(invoice=Invoice.objects.create(created_by=self.user), item=stale, quantity=3)
+    
+    self.item.refresh_from_db()
+    self.assertEqual((self.item.hot_shards, self.item.stock_remaining), (2, 7))
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  def test_movement_of_a_stale_instance_of_an_item_made_hot_uses_the_shards(self):
+    stale = Inventory.objects.get(id=self.item.id)
+    self.item.enable_hot_mode(shards=2)
+    record_movement(stale, "adjustment", -3, self.user)
+    
+    self.item.refresh_from_db()
+    self.assertEqual(self.item.stock_remaining, 7)
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  def test_sale_of_a_stale_hot_instance_of_an_item_back_on_one_counter(self):
+    self.item.enable_hot_mode(shards=2)
+    stale = Inventory.objects.get(id=self.item.id)
+    self.item.disable_hot_mode()
+    InvoiceItem.objects.create(invoice=Invoice.objects.create(created_by=self.user), item=stale, quantity=4)
+    
+    self.item.refresh_from_db()
+    self.assertEqual((self.item.hot_shards, self.item.remaining), (0, 6))
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  def test_remaining_filter_uses_the_stock_of_hot_items(self):
+    self.item.enable_hot_mode(shards=2)
+    InvoiceItem.objects.create(invoice=Invoice.objects.create(created_by=self.user), item=self.item, quantity=8)
+    cold = Inventory.objects.create(name="Cold", total=10, created_by=self.user)
+    
+    self.assertEqual(list(InventoryFilter({"remaining__gte": "5"}).filter(Inventory.objects.all())), [cold])
+    self.assertEqual(list(InventoryFilter({"remaining": "2"}).filter(Inventory.objects.all())), [self.item])
+    
+class InventoryStockApiTests(TestCase):
+  def setUp(self):
+    self.user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    self.item = Inventory.objects.create(name="Item", total=10, created_by=self.user)
+    self.auth = {"HTTP_AUTHORIZATION": f"Bearer {get_access_token({'user_id': self.user.id}, 1)}"}
+    
+  def record(self, data):
+    request = APIRequestFactory().post(f"/app/inventory/{self.item.id}/movements", data, format="json", **self.auth)
+    return InventoryView.as_view({"post": "movements"})(request, pk=self.item.id)
+  
+  def stock(self, **params):
+    request = APIRequestFactory().get(f"/app/inventory/{self.item.id}/stock", params, **self.auth)
+    return InventoryView.as_view({"get": "stock"})(request, pk=self.item.id)
+  
+  def test_movements_change_the_stock_through_the_ledger(self):
+    self.assertEqual(self.record({"kind": "receipt", "quantity": 5, "note": "delivery"}).status_code, 201)
+    self.assertEqual(self.record({"kind": "adjustment", "quantity": -3}).status_code, 201)
+    
+    self.item.refresh_from_db()
+    self.assertEqual(self.item.remaining, 12)
+    self.assertEqual(list(find_stock_mismatches()), [])
+    kinds = StockMovement.objects.filter(item=self.item).order_by("id").values_list("kind", "quantity")
+    self.assertEqual(list(kinds), [("receipt", 10), ("receipt", 5), ("adjustment", -3)])
+    
+  def test_invalid_movements_are_refused(self):
+    self.assertEqual(self.record({"kind": "sale", "quantity": -1}).status_code, 400)
+    self.assertEqual(self.record({"kind": "receipt", "quantity": -1}).status_code, 400)
+    self.assertEqual(self.record({"kind": "adjustment", "quantity": -11}).status_code, 400)
+    
+    self.item.refresh_from_db()
+    self.assertEqual(self.item.remaining, 10)
+    
+  def test_stock_at_a_point_in_time(self):
+    before = timezone.now()
+    record_movement(self.item, "receipt", 5)
+    take_snapshots()
+    record_movement(self.item, "adjustment", -2)
+    
+    self.assertEqual(self.stock(at=before.isoformat()).data["stock"], 10)
+    self.assertEqual(self.stock().data["stock"], 13)
+    self.assertEqual(self.stock(at=(before - timedelta(days=1)).isoformat()).data["stock"], 0)
+    self.assertEqual(self.stock(at="yesterday").status_code, 400)
+    
+@override_settings(STOCK_SNAPSHOT_SAFETY_SECONDS=60)
+class StockSnapshotTests(TestCase):
+  def at(self, when):
+    return mock.patch("django.utils.timezone.now", return_value=when)
+  
+  def test_movement_committed_after_a_snapshot_run_is_not_lost(self):
+    start = timezone.now()
+    with self.at(start - timedelta(hours=1)):
+      user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+      item = Inventory.objects.create(name="Item", total=10, created_by=user)
+    with self.at(start):
+      self.assertEqual(take_snapshots(), 1)
+    # Stamped before the first run but committed after it, like a movement of a long running transaction
+    with self.at(start - timedelta(seconds=30)):
+      record_movement(item, "receipt", 5)
+    with self.at(start + timedelta(minutes=5)):
+      self.assertEqual(take_snapshots(), 1)
+      
+    self.assertEqual(list(StockSnapshot.objects.order_by("taken_at").values_list("quantity", flat=True)), [10, 15])
+    self.assertEqual(stock_at(item, start + timedelta(minutes=10)), 15)
+    self.assertEqual(stock_at(item, start - timedelta(minutes=10)), 10)
+    
+class StockEventTests(TestCase):
+  def setUp(self):
+    self.user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    self.item = Inventory.objects.create(name="Item", total=10, created_by=self.user)
+    patcher = mock.patch("app_control.events.get_broadcaster")
+    self.broadcaster = patcher.start().return_value
+    self.addCleanup(patcher.stop)
+    
+  def pushed_stock(self):
+    return [call.args[1]["remaining"] for call in self.broadcaster.publish.call_args_list]
+  
+  def test_events_carry_the_stock_of_the_row_not_of_stale_instances(self):
+    invoice = Invoice.objects.create(created_by=self.user)
+    first, second = Inventory.objects.get(id=self.item.id), Inventory.objects.get(id=self.item.id)
+    with self.captureOnCommitCallbacks(execute=True):
+      InvoiceItem.objects.create(invoice=invoice, item=first, quantity=1)
+      InvoiceItem.objects.create(invoice=invoice, item=second, quantity=2)
+      record_movement(first, "receipt", 4)
+      first.name = "Renamed"
+      first.save()
+      
+    self.assertEqual(self.pushed_stock(), [9, 7, 11, 11])
+
+class StockTakeTests(TestCase):
+  def setUp(self):
+    self.user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    self.item = Inventory.objects.create(name="Item", total=10, created_by=self.user)
+    self.hot_item = Inventory.objects.create(name="Hot item", total=10, created_by=self.user)
+    self.hot_item.enable_hot_mode(shards=2)
+    
+  def test_variance_report_adds_up_the_lines_of_a_code_whatever_its_case(self):
+    lines = [(self.item.code.lower(), 4), (self.item.code, 3), (self.hot_item.code, 10), ("nope", 1)]
+    
+    report = reconcile_stock_take(lines)
+    self.assertEqual((report["lines"], report["items_counted"], report["applied"]), (4, 2, False))
+    self.assertEqual(
+      [(line["id"], line["expected"], line["counted"], line["variance"]) for line in report["discrepancies"]],
+      [(self.item.id, 10, 7, -3)]
+    )
+    self.assertEqual(report["unknown_codes"], ["nope"])
+    self.item.refresh_from_db()
+    self.assertEqual(self.item.remaining, 10)
+    
+  def test_applied_stock_take_keeps_the_ledger_and_the_shards_consistent(self):
+    report = reconcile_stock_take([(self.item.code, 7), (self.hot_item.code, 12)], apply=True, user=self.user)
+    
+    self.assertTrue(report["applied"])
+    self.item.refresh_from_db()
+    self.hot_item.refresh_from_db()
+    self.assertEqual((self.item.remaining, self.hot_item.stock_remaining), (7, 12))
+    self.assertEqual(
+      list(StockMovement.objects.filter(note="stock take").order_by("item_id").values_list("item_id", "quantity")),
+      [(self.item.id, -3), (self.hot_item.id, 2)]
+    )
+    self.assertEqual(list(find_stock_mismatches()), [])
+    
+  @override_settings(STOCK_TAKE_MAX_LINES=2)
+  def test_number_of_lines_is_capped(self):
+    self.assertTrue(StockTakeSerializer(data={"lines": [["A1", 1], ["A2", 2]]}).is_valid())
+    serializer = StockTakeSerializer(data={"lines": [["A1", 1], ["A2", 2], ["A3", 3]]})
+    self.assertFalse(serializer.is_valid())
+    self.assertIn("lines", serializer.errors)
@@ -0,0 +1,13 @@
+from django.urls import path, include
+from .views import InventoryView, InventoryGroupView, ShopView, StockTakeView
+from rest_framework.routers import DefaultRouter
+
+router = DefaultRouter(trailing_slash = False)
+router.register("inventory", InventoryView, "inventory")
+router.register("group", InventoryGroupView, "group")
+router.register("shop", ShopView, "shop")
+router.register("stock-take", StockTakeView, "stock-take")
+
+urlpatterns = [
+    path("", include(router.urls))
+]
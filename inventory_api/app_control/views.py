@@ -1,9 +1,18 @@
 from rest_framework.viewsets import ModelViewSet
-from .serializers import Inventory, InventorySerializer, InventoryGroup, InventoryGroupSerializer, Shop, ShopSerializer
+from .serializers import Inventory, InventorySerializer, InventoryGroup, InventoryGroupSerializer, Shop, ShopSerializer, StockMovementSerializer, StockTakeSerializer
+from .filters import InventoryFilter, InventoryGroupFilter, ShopFilter
+from .models import InsufficientStock
+from .stock import record_movement, shard_total, stock_at
+from .stocktake import reconcile_stock_take
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from inventory_api.custom_methods import IsAuthenticatedCustom
+from inventory_api.filters import to_datetime
 from inventory_api.utils import CustomPagination, get_query
-from django.db.models import Count
+from django.db.models import Case, Count, Prefetch, When
+from django.utils import timezone
 
 # Create your views here.
 class InventoryView(ModelViewSet):
@@ -16,20 +25,26 @@ class InventoryView(ModelViewSet):
   So you get a list of user activities, and for each user activity, you also have the associated user object attached to it. 
   This is useful when you primarily want to work with user activities and also need access to the associated user information.
   '''
-  queryset = Inventory.objects.select_related("group", "created_by")
+  # legacy_photo may still hold base64 blobs that were not moved to file storage yet, list queries must never read them
+  # Hot items keep their stock in shards, the CASE only runs the shard subquery for those rows
+  queryset = Inventory.objects.select_related("group", "created_by").defer("legacy_photo").annotate(
+    shard_remaining=Case(When(hot_shards__gt=0, then=shard_total()))
+  )
   serializer_class = InventorySerializer
+  filter_class = InventoryFilter
   permission_classes = (IsAuthenticatedCustom, )
   pagination_class = CustomPagination
+  use_read_replica = True
   
   def get_queryset(self):
-    if self.request.method.lower() != 'get':
+    # The query parameters of the stock action are not filters
+    if self.request.method.lower() != 'get' or self.action == "stock":
       return self.queryset
     
     data = self.request.query_params.dict()
-    data.pop("page")
-    keyword = data.pop("keyword", None)
+    keyword = data.get("keyword", None)
     
-    results = self.queryset(**data)
+    results = self.filter_class(data).filter(self.queryset)
     
     if keyword:
       search_fields = ("code", "created_by__fullname", "created_by__email", "group__name", "name")
@@ -42,6 +57,37 @@ class InventoryView(ModelViewSet):
     request.data.update({"created_by_id": request.user.id})
     return super().create(request, *args, **kwargs)
   
+  @action(detail=True, methods=["post"])
+  def movements(self, request, pk=None):
+    '''
+    POST /app/inventory/<id>/movements {"kind": "receipt", "quantity": 20, "note": "delivery 1042"}
+    
+    Records a receipt, return or adjustment (see stock.record_movement). remaining and total cannot be edited, this is how
+    the stock of an item changes outside of sales and stock takes.
+    '''
+    item = self.get_object()
+    valid_req = StockMovementSerializer(data=request.data)
+    valid_req.is_valid(raise_exception=True)
+    
+    try:
+      movement = record_movement(item, user=request.user, **valid_req.validated_data)
+    except InsufficientStock as e:
+      return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(StockMovementSerializer(movement).data, status=status.HTTP_201_CREATED)
+  
+  @action(detail=True, methods=["get"])
+  def stock(self, request, pk=None):
+    '''
+    GET /app/inventory/<id>/stock?at=2023-05-01T12:00 - the stock of the item at that time (now without at), from the
+    stock snapshots and the ledger (see stock.stock_at).
+    '''
+    item = self.get_object()
+    try:
+      at = to_datetime(request.query_params["at"]) if "at" in request.query_params else timezone.now()
+    except ValueError as e:
+      raise ValidationError({"at": str(e)})
+    return Response({"id": item.id, "code": item.code, "at": at, "stock": stock_at(item, at)})
+  
 class InventoryGroupView(ModelViewSet):
   '''
   On the other hand, with prefetch_related, it retrieves a list of users and a list of activities separately, and then links them together based on the defined relationship. 
@@ -61,20 +107,23 @@ class InventoryGroupView(ModelViewSet):
   This means that when you access the "inventories" field on an InventoryGroup instance, the associated inventories will already be available 
   in memory without needing to query the database again.
   '''
-  queryset = InventoryGroup.objects.select_related("belongs_to", "created_by").prefetch_related("inventories")
+  queryset = InventoryGroup.objects.select_related("belongs_to", "created_by").prefetch_related(
+    Prefetch("inventories", queryset=Inventory.objects.defer("legacy_photo"))
+  )
   serializer_class = InventoryGroupSerializer
+  filter_class = InventoryGroupFilter
   permission_classes = (IsAuthenticatedCustom, )
   pagination_class = CustomPagination
+  use_read_replica = True
   
   def get_queryset(self):
     if self.request.method.lower() != 'get':
       return self.queryset
     
     data = self.request.query_params.dict()
-    data.pop("page")
-    keyword = data.pop("keyword", None)
+    keyword = data.get("keyword", None)
     
-    results = self.queryset(**data)
+    results = self.filter_class(data).filter(self.queryset)
     
     if keyword:
       search_fields = ("created_by__fullname", "created_by__email", "name")
@@ -92,18 +141,19 @@ class InventoryGroupView(ModelViewSet):
 class ShopView(ModelViewSet):
   queryset = Shop.objects.select_related("created_by")
   serializer_class = ShopSerializer
+  filter_class = ShopFilter
   permission_classes = (IsAuthenticatedCustom, )
   pagination_class = CustomPagination
+  use_read_replica = True
   
   def get_queryset(self):
     if self.request.method.lower() != 'get':
       return self.queryset
     
     data = self.request.query_params.dict()
-    data.pop("page")
-    keyword = data.pop("keyword", None)
+    keyword = data.get("keyword", None)
     
-    results = self.queryset(**data)
+    results = self.filter_class(data).filter(self.queryset)
     
     if keyword:
       search_fields = ("created_by__fullname", "created_by__email", "name")
@@ -114,4 +164,27 @@ class ShopView(ModelViewSet):
   
   def create(self, request, *args, **kwargs):
     request.data.update({"created_by_id": request.user.id})
-    return super().create(request, *args, **kwargs)
\ No newline at end of file
+    return super().create(request, *args, **kwargs)
+  
+class StockTakeView(ModelViewSet):
+  '''
+  Compares a physical count sheet with the stock of the items (see stocktake.py).
+  
+    POST /app/stock-take
+    {"lines": [["BOSE000001", 12], ["BOSE000002", 0], ...], "apply": false}
+    
+  Returns the variance report: the items whose count differs from their stock, and the codes that match no item. With
+  "apply": true the stock of those items is also set to their counts.
+  '''
+  http_method_names = ["post"]
+  serializer_class = StockTakeSerializer
+  permission_classes = (IsAuthenticatedCustom, )
+  
+  def create(self, request):
+    valid_req = self.serializer_class(data=request.data)
+    valid_req.is_valid(raise_exception=True)
+    
+    report = reconcile_stock_take(
+      valid_req.validated_data["lines"], apply=valid_req.validated_data["apply"], user=request.user
+    )
+    return Response(report)
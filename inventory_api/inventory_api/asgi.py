@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up
+from inventory_api.sse import EVENTS_PATH, stock_events
+
+
+async def application(scope, receive, send):
+    """
+    The stock event stream is served next to Django, every other request goes to Django as usual.
+    """
+    if scope["type"] == "http" and scope["path"] == EVENTS_PATH:
+        await stock_events(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -0,0 +1,116 @@
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.viewsets import ModelViewSet
+from .custom_methods import IsAuthenticatedCustom
+from .db_router import can_use_replica, stop_using_replica, use_replica
+
+'''
+Batch endpoint: runs several GET requests of the API in one round trip.
+
+  POST /batch
+  {"requests": [{"path": "/user/me"}, {"path": "/app/inventory?page=2"}, {"path": "/app/group"}]}
+
+The batch request is authenticated once, and its sub-requests skip the JWT decoding, the user lookup and the middleware.
+They run concurrently in a thread pool, and their responses come back in the order of the requests:
+
+  {"responses": [{"path": "/user/me", "status": 200, "body": {...}}, ...]}
+
+A batch may hold at most BATCH_MAX_REQUESTS requests. Sub-requests still running after BATCH_TIMEOUT_SECONDS are reported
+with status 504. Only the API endpoints can be batched (not the admin or the media files), and only their JSON responses:
+a download or any other response that is not JSON is reported with status 406.
+'''
+
+EXCLUDED_META = ("CONTENT_LENGTH", "CONTENT_TYPE", "wsgi.input")
+
+class BatchSubRequestSerializer(serializers.Serializer):
+  method = serializers.ChoiceField(("GET", ), default="GET")
+  path = serializers.CharField()
+
+class BatchSerializer(serializers.Serializer):
+  requests = serializers.ListField(child=BatchSubRequestSerializer(), allow_empty=False)
+
+  def validate_requests(self, requests):
+    if len(requests) > settings.BATCH_MAX_REQUESTS:
+      raise serializers.ValidationError(f"a batch can hold at most {settings.BATCH_MAX_REQUESTS} requests")
+    return requests
+
+class SubRequest(HttpRequest):
+  def __init__(self, parent, path, query_string):
+    super().__init__()
+    self.method = "GET"
+    self.path = self.path_info = path
+    self.META = {key: value for key, value in parent.META.items() if key not in EXCLUDED_META}
+    self.META.update({"REQUEST_METHOD": "GET", "PATH_INFO": path, "QUERY_STRING": query_string})
+    self.GET = QueryDict(query_string)
+    self.parent_scheme = parent.scheme
+    self.batch_user = parent.user
+
+  def _get_scheme(self):
+    return self.parent_scheme
+
+def run_sub_request(parent, path):
+  path_only, _, query_string = path.partition("?")
+  try:
+    match = resolve(path_only)
+  except Resolver404:
+    return {"path": path, "status": status.HTTP_404_NOT_FOUND, "body": {"detail": "Not found."}}
+  view = getattr(match.func, "cls", None)
+  if view is BatchView:
+    return {"path": path, "status": status.HTTP_400_BAD_REQUEST, "body": {"detail": "Batches cannot be nested."}}
+  # The sub-requests skip the middleware, which views outside of the API (the admin...) depend on
+  if view is None or not issubclass(view, APIView):
+    return {"path": path, "status": status.HTTP_400_BAD_REQUEST, "body": {"detail": "Only API endpoints can be batched."}}
+
+  request = SubRequest(parent, path_only, query_string)
+  token = use_replica() if can_use_replica(request, match.func) else None
+  try:
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, "data"):
+      # DRF responses are returned unrendered, the whole batch is rendered once
+      body = response.data
+    elif response.streaming or response.get("Content-Type", "").split(";")[0] != "application/json":
+      return {"path": path, "status": status.HTTP_406_NOT_ACCEPTABLE, "body": {"detail": "Only JSON responses can be batched."}}
+    else:
+      body = json.loads(response.content)
+  except Exception as e:
+    return {"path": path, "status": status.HTTP_500_INTERNAL_SERVER_ERROR, "body": {"error": str(e)}}
+  finally:
+    if token is not None:
+      stop_using_replica(token)
+    # Each pool thread opens its own database connections
+    connections.close_all()
+
+  return {"path": path, "status": response.status_code, "body": body}
+
+class BatchView(ModelViewSet):
+  http_method_names = ["post"]
+  permission_classes = (IsAuthenticatedCustom, )
+  # Batches only read, they must not keep the client off the read replicas (see db_router)
+  pins_primary = False
+
+  def create(self, request):
+    valid_req = BatchSerializer(data=request.data)
+    valid_req.is_valid(raise_exception=True)
+    paths = [sub_request["path"] for sub_request in valid_req.validated_data["requests"]]
+
+    parent = request._request
+    parent.user = request.user
+    executor = ThreadPoolExecutor(max_workers=min(len(paths), settings.BATCH_MAX_WORKERS))
+    futures = [executor.submit(run_sub_request, parent, path) for path in paths]
+    wait(futures, timeout=settings.BATCH_TIMEOUT_SECONDS)
+    # Sub-requests that are still running finish in the background, their results are dropped
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    timed_out = {"status": status.HTTP_504_GATEWAY_TIMEOUT, "body": {"detail": "Timed out."}}
+    responses = [
+      future.result() if future.done() and not future.cancelled() else {"path": path, **timed_out}
+      for path, future in zip(paths, futures)
+    ]
+    return Response({"responses": responses})
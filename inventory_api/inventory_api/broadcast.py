@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+'''
+Fan-out of small events from the code that writes data (any thread, sync) to the clients listening on the event stream
+(asyncio tasks of the ASGI application, see sse.py). Every event is published to a list of channels, e.g. "group:3", and
+every subscriber only receives the events of the channels it subscribed to.
+
+STOCK_EVENTS_BACKEND selects the broadcaster:
+- InProcessBroadcaster (default) delivers events inside the current process. That is enough when the API and the event
+  stream are served by the same single ASGI process.
+- PostgresBroadcaster sends events through PostgreSQL NOTIFY, and every process LISTENs for them. This way events written
+  by any web worker, job worker or node reach every client.
+'''
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+  def __init__(self, channels, max_pending=100):
+    self.channels = set(channels)
+    self.loop = asyncio.get_running_loop()
+    # A client that cannot keep up loses events instead of growing the queue without limit
+    self.queue = asyncio.Queue(maxsize=max_pending)
+
+  def deliver(self, event):
+    try:
+      self.queue.put_nowait(event)
+    except asyncio.QueueFull:
+      pass
+
+class InProcessBroadcaster:
+  def __init__(self):
+    self._subscriptions = set()
+    self._lock = threading.Lock()
+
+  def subscribe(self, channels):
+    '''
+    Must be called from the event loop the events will be read in.
+    '''
+    subscription = Subscription(channels)
+    with self._lock:
+      self._subscriptions.add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    with self._lock:
+      self._subscriptions.discard(subscription)
+
+  def publish(self, channels, event):
+    self.deliver(set(channels), event)
+
+  def deliver(self, channels, event):
+    with self._lock:
+      subscriptions = [subscription for subscription in self._subscriptions if subscription.channels & channels]
+    for subscription in subscriptions:
+      try:
+        subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+      except RuntimeError:
+        # The event loop of the subscriber has been closed
+        self.unsubscribe(subscription)
+
+class PostgresBroadcaster(InProcessBroadcaster):
+  notify_channel = "stock_events"
+
+  def __init__(self):
+    super().__init__()
+    self._listener = None
+
+  def subscribe(self, channels):
+    with self._lock:
+      if self._listener is None:
+        self._listener = threading.Thread(target=self.listen, name="broadcast-listener", daemon=True)
+        self._listener.start()
+    return super().subscribe(channels)
+
+  def publish(self, channels, event):
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT pg_notify(%s, %s)", [self.notify_channel, json.dumps({"channels": list(channels), "event": event})])
+
+  def listen(self):
+    while True:
+      try:
+        self.listen_once()
+      except Exception:
+        logger.exception("lost the connection listening for %s, reconnecting", self.notify_channel)
+        threading.Event().wait(5)
+
+  def listen_once(self):
+    # A dedicated connection outside of Django's, it stays in LISTEN mode for the life of the process
+    db = connection.settings_dict
+    listener = connection.Database.connect(
+      dbname=db["NAME"], user=db["USER"], password=db["PASSWORD"], host=db["HOST"], port=db["PORT"]
+    )
+    listener.autocommit = True
+    try:
+      with listener.cursor() as cursor:
+        cursor.execute(f"LISTEN {self.notify_channel}")
+      while True:
+        if select.select([listener], [], [], 60) == ([], [], []):
+          continue
+        listener.poll()
+        while listener.notifies:
+          message = json.loads(listener.notifies.pop(0).payload)
+          self.deliver(set(message["channels"]), message["event"])
+    finally:
+      listener.close()
+
+_broadcaster = None
+_broadcaster_lock = threading.Lock()
+
+def get_broadcaster():
+  global _broadcaster
+  with _broadcaster_lock:
+    if _broadcaster is None:
+      _broadcaster = import_string(settings.STOCK_EVENTS_BACKEND)()
+  return _broadcaster
@@ -0,0 +1,56 @@
+import gzip
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+'''
+Compresses responses above RESPONSE_COMPRESSION_MIN_BYTES, with brotli when the client accepts it and the brotli package is
+installed, with gzip otherwise. Small responses are sent as they are: compressing them costs more time than it saves.
+Streaming responses (such as file downloads) are never compressed.
+'''
+
+def accepted_encodings(request):
+  encodings = set()
+  for part in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+    encoding, _, params = part.strip().partition(";")
+    if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+      encodings.add(encoding.strip().lower())
+  return encodings
+
+class CompressionMiddleware:
+  def __init__(self, get_response):
+    self.get_response = get_response
+    
+  def __call__(self, request):
+    response = self.get_response(request)
+    if response.streaming or response.has_header("Content-Encoding"):
+      return response
+    if len(response.content) < settings.RESPONSE_COMPRESSION_MIN_BYTES:
+      return response
+    
+    patch_vary_headers(response, ("Accept-Encoding", ))
+    encodings = accepted_encodings(request)
+    if brotli is not None and "br" in encodings:
+      encoding = "br"
+      compressed = brotli.compress(response.content, quality=settings.BROTLI_QUALITY)
+    elif "gzip" in encodings:
+      encoding = "gzip"
+      compressed = gzip.compress(response.content, compresslevel=settings.GZIP_LEVEL, mtime=0)
+    else:
+      return response
+    
+    if len(compressed) >= len(response.content):
+      return response
+    
+    response.content = compressed
+    response["Content-Length"] = str(len(compressed))
+    response["Content-Encoding"] = encoding
+    # The compressed body is no longer byte for byte the one a strong ETag was computed for
+    etag = response.get("ETag")
+    if etag and etag.startswith('"'):
+      response["ETag"] = "W/" + etag
+    return response
@@ -17,8 +17,14 @@ class IsAuthenticatedCustom(BasePermission):
     In other words: The has_permission function checks whether the user has logged in and has been authorized to 
                     access the system for the duration specified by the token.
     '''
+    # The sub-requests of a batch (see batch.py) reuse the user the batch request was authenticated as
+    batch_user = getattr(request, "batch_user", None)
+    if batch_user is not None:
+      request.user = batch_user
+      return True
+    
     try:
-      auth_token = request.Meta.get("HTTP_AUTHORIZATION", None)
+      auth_token = request.META.get("HTTP_AUTHORIZATION", None)
     except Exception:
       return False
     if not auth_token:
@@ -29,4 +35,13 @@ class IsAuthenticatedCustom(BasePermission):
       return False
     request.user = user
     return True
+  
+class IsAdminCustom(IsAuthenticatedCustom):
+  '''
+  Same as IsAuthenticatedCustom, but the user also needs the admin role (or to be a superuser).
+  '''
+  def has_permission(self, request, view):
+    if not super().has_permission(request, view):
+      return False
+    return request.user.role == "admin" or request.user.is_superuser
     
\ No newline at end of file
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+'''
+Read replica routing.
+
+Views that set use_read_replica = True have their GET requests served from one of the replica databases (every alias in
+DATABASES whose name starts with "replica_"). Everything else, including all writes, uses the default database. The replica
+is picked once per request, so that all its queries (such as the count and the rows of a page) see the same data.
+
+Read-your-writes: after a client makes a successful write, its reads stay on the primary for REPLICA_STICKY_SECONDS, so it
+never sees a replica that has not caught up with its own change yet. Clients are told apart by their Authorization header,
+and the pin is kept in the Django cache (use a shared cache backend when running several processes).
+
+Replicas are checked at most every REPLICA_HEALTH_CHECK_SECONDS. A replica that cannot be reached, or that is more than
+REPLICA_MAX_LAG_SECONDS behind the primary, is skipped until the next check; with no healthy replica, reads go to the primary.
+'''
+
+logger = logging.getLogger(__name__)
+
+_use_replica = ContextVar("use_replica", default=None)
+_replica_health = {}
+_replica_health_lock = threading.Lock()
+
+POSTGRES_LAG_QUERY = '''
+  SELECT CASE
+    WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+  END
+'''
+
+def replica_aliases():
+  return [alias for alias in settings.DATABASES if alias.startswith("replica_")]
+
+def check_replica(alias):
+  try:
+    with connections[alias].cursor() as cursor:
+      if connections[alias].vendor == "postgresql":
+        cursor.execute(POSTGRES_LAG_QUERY)
+        lag = float(cursor.fetchone()[0] or 0)
+      else:
+        cursor.execute("SELECT 1")
+        lag = 0
+  except DatabaseError:
+    logger.warning("read replica %s is not reachable", alias, exc_info=True)
+    return False
+
+  if lag > settings.REPLICA_MAX_LAG_SECONDS:
+    logger.warning("read replica %s is %.1f seconds behind", alias, lag)
+    return False
+  return True
+
+def is_replica_healthy(alias):
+  now = time.monotonic()
+  with _replica_health_lock:
+    # A replica is not used before its first check has passed
+    checked_at, healthy = _replica_health.get(alias, (None, False))
+    due = checked_at is None or now - checked_at >= settings.REPLICA_HEALTH_CHECK_SECONDS
+    if due:
+      # Marked as checked right away: only this thread probes the replica, the others keep the last known state meanwhile
+      _replica_health[alias] = (now, healthy)
+  if due:
+    healthy = check_replica(alias)
+    _replica_health[alias] = (time.monotonic(), healthy)
+  return healthy
+
+def _pin_key(request):
+  auth_token = request.META.get("HTTP_AUTHORIZATION")
+  if not auth_token:
+    return None
+  return "replica-pin:" + hashlib.sha256(auth_token.encode()).hexdigest()
+
+def can_use_replica(request, view_func):
+  '''
+  Whether the request may read from a replica: a GET to a view with use_read_replica, from a client that has not
+  written anything within the last REPLICA_STICKY_SECONDS.
+  '''
+  # DRF's as_view() keeps a reference to the view class on the function it returns
+  view_class = getattr(view_func, "cls", None)
+  if request.method != "GET" or not getattr(view_class, "use_read_replica", False):
+    return False
+  key = _pin_key(request)
+  return not (key and cache.get(key))
+
+def use_replica():
+  '''
+  Sends the reads of the current thread (or task) to one of the healthy replicas, or to the primary when there is none,
+  until reset with the returned token.
+  '''
+  healthy = [alias for alias in replica_aliases() if is_replica_healthy(alias)]
+  return _use_replica.set(random.choice(healthy) if healthy else None)
+
+def stop_using_replica(token):
+  _use_replica.reset(token)
+
+class ReplicaRouter:
+  def db_for_read(self, model, **hints):
+    return _use_replica.get()
+
+  def db_for_write(self, model, **hints):
+    return "default"
+
+  def allow_relation(self, obj1, obj2, **hints):
+    # Replicas hold the same data as the primary, objects read from either can be related
+    return True
+
+  def allow_migrate(self, db, app_label, model_name=None, **hints):
+    return db == "default"
+
+class ReplicaRoutingMiddleware:
+  def __init__(self, get_response):
+    self.get_response = get_response
+
+  def __call__(self, request):
+    response = self.get_response(request)
+
+    token = getattr(request, "_replica_token", None)
+    if token is not None:
+      stop_using_replica(token)
+
+    # Views that only read data even though they are called with POST (such as the batch endpoint) set pins_primary = False
+    writes = request.method not in ("GET", "HEAD", "OPTIONS") and getattr(request, "_pins_primary", True)
+    if writes and response.status_code < 400:
+      key = _pin_key(request)
+      if key:
+        cache.set(key, True, timeout=settings.REPLICA_STICKY_SECONDS)
+    return response
+
+  def process_view(self, request, view_func, view_args, view_kwargs):
+    request._pins_primary = getattr(getattr(view_func, "cls", None), "pins_primary", True)
+    if can_use_replica(request, view_func):
+      request._replica_token = use_replica()
+    return None
@@ -0,0 +1,96 @@
+from datetime import datetime, time
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+'''
+A FilterSet declares which query parameters a list view accepts. Instead of passing request.query_params straight into
+queryset.filter(), every parameter is checked against the declared fields, converted to the right type once, and only then
+turned into a lookup. Any other parameter is rejected with a 400 response.
+
+  exact_fields  - fields that can only be compared for equality, e.g. ?group_id=3
+  range_fields  - fields that accept ranges, e.g. ?price__gte=10&price__lt=20 (plain ?price=10 is an equality match)
+
+Every declared field has to be backed by a database index, this is checked when the FilterSet class is defined.
+A request may range-filter on one column only, unless it also has an equality filter to narrow the rows down first:
+two independent open ranges cannot both use an index and end up scanning the whole table.
+'''
+
+RANGE_LOOKUPS = ("gt", "gte", "lt", "lte")
+# Parameters read by the views and DRF themselves (pagination, search, ?format=json...), not filters
+RESERVED_PARAMS = ("page", "keyword", api_settings.URL_FORMAT_OVERRIDE)
+
+def to_datetime(value):
+  '''
+  Accepts a full ISO datetime or just a date (meaning midnight of that day), naive values are read in the current timezone.
+  '''
+  parsed = parse_datetime(value)
+  if parsed is None:
+    day = parse_date(value)
+    if day is None:
+      raise ValueError(f"'{value}' is not a valid date")
+    parsed = datetime.combine(day, time.min)
+  if timezone.is_naive(parsed):
+    parsed = timezone.make_aware(parsed)
+  return parsed
+
+def is_indexed(model, field_name):
+  field = model._meta.get_field(field_name)
+  if field.primary_key or field.unique or field.db_index:
+    return True
+  # A composite index can only be used when the field is its first column
+  return any(index.fields and index.fields[0].lstrip("-") == field.name for index in model._meta.indexes)
+
+class FilterSet:
+  model = None
+  exact_fields = {}
+  range_fields = {}
+
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+    for field_name in (*cls.exact_fields, *cls.range_fields):
+      if not is_indexed(cls.model, field_name):
+        raise ImproperlyConfigured(f"{cls.__name__} filters on {cls.model.__name__}.{field_name}, which has no index")
+
+  def __init__(self, params):
+    self.lookups = self.parse(params)
+
+  def parse(self, params):
+    lookups = {}
+    errors = {}
+
+    for param, value in params.items():
+      if param in RESERVED_PARAMS:
+        continue
+
+      field_name, _, operator = param.partition("__")
+      if operator:
+        cast = self.range_fields.get(field_name) if operator in RANGE_LOOKUPS else None
+      else:
+        cast = self.exact_fields.get(field_name) or self.range_fields.get(field_name)
+
+      if cast is None:
+        errors[param] = "filtering on this field is not allowed"
+        continue
+
+      try:
+        lookups[param] = cast(value)
+      except (TypeError, ValueError):
+        errors[param] = f"'{value}' is not a valid value"
+
+    if errors:
+      raise ValidationError(errors)
+
+    range_columns = {param.partition("__")[0] for param in lookups if "__" in param}
+    has_equality = any("__" not in param for param in lookups)
+    if len(range_columns) > 1 and not has_equality:
+      raise ValidationError({
+        "filters": "ranges on more than one field need an equality filter as well: " + ", ".join(sorted(range_columns))
+      })
+
+    return lookups
+
+  def filter(self, queryset):
+    return queryset.filter(**self.lookups)
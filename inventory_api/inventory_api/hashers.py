@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+class ConfigurablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+  '''
+  Django's PBKDF2 hasher with the work factor taken from PASSWORD_PBKDF2_ITERATIONS. It keeps the pbkdf2_sha256 format, so
+  existing passwords keep working. Passwords hashed with a different number of iterations are upgraded the next time
+  their user logs in (in the background, see CustomUser.check_password).
+  '''
+  iterations = settings.PASSWORD_PBKDF2_ITERATIONS
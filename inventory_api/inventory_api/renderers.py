@@ -0,0 +1,33 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+'''
+JSON renderer and parser backed by orjson, which encodes and decodes several times faster than the json module of the
+standard library. When orjson is not installed they behave exactly like DRF's JSONRenderer and JSONParser.
+'''
+
+class FastJSONRenderer(JSONRenderer):
+  def render(self, data, accepted_media_type=None, renderer_context=None):
+    if orjson is None or data is None:
+      return super().render(data, accepted_media_type, renderer_context)
+    # Indented output was asked for (e.g. "Accept: application/json; indent=4"), leave it to the standard renderer
+    if self.get_indent(accepted_media_type or "", renderer_context or {}):
+      return super().render(data, accepted_media_type, renderer_context)
+    # Types orjson does not know (Decimal, lazy translations, querysets...) are converted the way DRF's encoder does
+    return orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_NON_STR_KEYS)
+  
+class FastJSONParser(JSONParser):
+  def parse(self, stream, media_type=None, parser_context=None):
+    if orjson is None:
+      return super().parse(stream, media_type, parser_context)
+    try:
+      return orjson.loads(stream.read())
+    except orjson.JSONDecodeError as e:
+      raise ParseError(f"JSON parse error - {e}")
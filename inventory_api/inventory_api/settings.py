@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -41,13 +41,18 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'user_control',
-    'app_control'
+    'app_control',
+    'job_control',
+    'profile_control'
 ]
 
 MIDDLEWARE = [
+    'profile_control.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'inventory_api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'inventory_api.db_router.ReplicaRoutingMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -74,6 +79,29 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'inventory_api.wsgi.application'
 
+# orjson based JSON rendering and parsing, with the standard library as fallback (see inventory_api/renderers.py)
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'inventory_api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'inventory_api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Reverse proxies in front of the API, the client IP (used by the login rate limits) is then taken from
+    # X-Forwarded-For. 0 means clients connect directly and X-Forwarded-For is ignored, as any client can set it
+    'NUM_PROXIES': config("NUM_PROXIES", default=0, cast=int),
+}
+
+# Response compression (see inventory_api/compression.py)
+RESPONSE_COMPRESSION_MIN_BYTES = config("RESPONSE_COMPRESSION_MIN_BYTES", default=1024, cast=int)
+
+BROTLI_QUALITY = config("BROTLI_QUALITY", default=4, cast=int)
+
+GZIP_LEVEL = config("GZIP_LEVEL", default=6, cast=int)
+
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
@@ -89,6 +117,80 @@ DATABASES = {
     }
 }
 
+# Seconds to wait for a replica connection, libpq does not go below 2
+REPLICA_CONNECT_TIMEOUT_SECONDS = config("REPLICA_CONNECT_TIMEOUT_SECONDS", default=2, cast=int)
+
+# Read replicas, e.g. DB_REPLICA_HOSTS=10.0.0.2,10.0.0.3:5433 (host[:port], same name and credentials as the primary).
+# Pointing a replica at the primary itself (DB_REPLICA_HOSTS=localhost) is enough to try the routing locally.
+for index, replica in enumerate(config("DB_REPLICA_HOSTS", default="", cast=Csv()), start=1):
+    host, _, port = replica.partition(":")
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        # Replicas are health checked on the request path, an unreachable host must fail fast instead of waiting for
+        # the TCP timeout of the OS
+        'OPTIONS': {**DATABASES['default'].get('OPTIONS', {}), 'connect_timeout': REPLICA_CONNECT_TIMEOUT_SECONDS},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['inventory_api.db_router.ReplicaRouter']
+
+# After a write, reads of the same client stay on the primary for this many seconds
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=5, cast=int)
+
+# Replicas further behind than this are not used
+REPLICA_MAX_LAG_SECONDS = config("REPLICA_MAX_LAG_SECONDS", default=10, cast=float)
+
+REPLICA_HEALTH_CHECK_SECONDS = config("REPLICA_HEALTH_CHECK_SECONDS", default=5, cast=int)
+
+
+# Background jobs (job_control), run by `python manage.py run_job_workers`
+
+# A running job is handed to another worker when it has not finished after this long (its worker is assumed dead)
+JOB_TIMEOUT_SECONDS = config("JOB_TIMEOUT_SECONDS", default=600, cast=int)
+
+# Delay before the first retry of a failed job, doubled on every further attempt up to the maximum
+JOB_RETRY_BACKOFF_SECONDS = config("JOB_RETRY_BACKOFF_SECONDS", default=10, cast=int)
+
+JOB_RETRY_MAX_BACKOFF_SECONDS = config("JOB_RETRY_MAX_BACKOFF_SECONDS", default=3600, cast=int)
+
+
+# Stock change events (/events/stock, see inventory_api/sse.py). Use inventory_api.broadcast.PostgresBroadcaster when
+# requests are served by more than one process, the default only reaches clients connected to the same process
+STOCK_EVENTS_BACKEND = config("STOCK_EVENTS_BACKEND", default="inventory_api.broadcast.InProcessBroadcaster")
+
+STOCK_EVENTS_HEARTBEAT_SECONDS = config("STOCK_EVENTS_HEARTBEAT_SECONDS", default=15, cast=int)
+
+
+# Stock snapshots only cover movements at least this old (see app_control/stock.py snapshot_safe_point)
+STOCK_SNAPSHOT_SAFETY_SECONDS = config("STOCK_SNAPSHOT_SAFETY_SECONDS", default=60, cast=int)
+
+
+# Stock takes (/app/stock-take, see app_control/stocktake.py)
+STOCK_TAKE_MAX_LINES = config("STOCK_TAKE_MAX_LINES", default=200000, cast=int)
+
+
+# Batch endpoint (/batch, see inventory_api/batch.py)
+
+BATCH_MAX_REQUESTS = config("BATCH_MAX_REQUESTS", default=20, cast=int)
+
+# Sub-requests that run in parallel, each of them uses its own database connection
+BATCH_MAX_WORKERS = config("BATCH_MAX_WORKERS", default=6, cast=int)
+
+BATCH_TIMEOUT_SECONDS = config("BATCH_TIMEOUT_SECONDS", default=10, cast=float)
+
+
+# Request profiling (profile_control). Admins can profile any request by sending the X-Profile header,
+# PROFILE_SAMPLE_RATE additionally profiles that fraction of all requests (0.01 = 1 in 100)
+
+PROFILE_SAMPLE_RATE = config("PROFILE_SAMPLE_RATE", default=0, cast=float)
+
+# Number of functions of the call tree stored per profile, and number of profiles kept
+PROFILE_MAX_FUNCTIONS = config("PROFILE_MAX_FUNCTIONS", default=50, cast=int)
+
+PROFILE_KEEP = config("PROFILE_KEEP", default=200, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -109,6 +211,31 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# PBKDF2 work factor for new passwords, existing ones are upgraded on their next login (see inventory_api/hashers.py)
+PASSWORD_PBKDF2_ITERATIONS = config("PASSWORD_PBKDF2_ITERATIONS", default=600000, cast=int)
+
+PASSWORD_HASHERS = [
+    'inventory_api.hashers.ConfigurablePBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Login rate limits (token buckets, see inventory_api/throttling.py). TokenBucket limits every process on its own,
+# CacheTokenBucket shares the limits through the cache backend in CACHES
+LOGIN_RATE_LIMIT_BACKEND = config("LOGIN_RATE_LIMIT_BACKEND", default="inventory_api.throttling.TokenBucket")
+
+LOGIN_IP_RATE_PER_MINUTE = config("LOGIN_IP_RATE_PER_MINUTE", default=30, cast=int)
+
+LOGIN_IP_BURST = config("LOGIN_IP_BURST", default=10, cast=int)
+
+LOGIN_EMAIL_RATE_PER_MINUTE = config("LOGIN_EMAIL_RATE_PER_MINUTE", default=5, cast=int)
+
+LOGIN_EMAIL_BURST = config("LOGIN_EMAIL_BURST", default=5, cast=int)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -126,6 +253,25 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (inventory photos and their thumbnails)
+# https://docs.djangoproject.com/en/4.2/topics/files/
+
+MEDIA_URL = 'media/'
+
+MEDIA_ROOT = config("MEDIA_ROOT", default=BASE_DIR / 'media')
+
+# Generate thumbnails in the job workers instead of a thread pool of the web process
+THUMBNAILS_USE_JOB_QUEUE = config("THUMBNAILS_USE_JOB_QUEUE", default=False, cast=bool)
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,69 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .broadcast import get_broadcaster
+from .utils import decodeJWT
+
+'''
+Server-Sent Events stream of stock changes, served directly by the ASGI application (see asgi.py) so that an open connection
+does not hold a Django worker.
+
+  GET /events/stock?token=<access token>&group=3&group=4&shop=1
+
+EventSource cannot send an Authorization header, the access token is passed as a query parameter instead.
+Without group or shop parameters the client receives the changes of all items. Every change arrives as
+
+  event: stock
+  data: {"id": 12, "remaining": 40, "price": 2.5, "group_id": 3}
+
+and a comment line is sent every STOCK_EVENTS_HEARTBEAT_SECONDS to keep proxies from closing an idle connection.
+'''
+
+EVENTS_PATH = "/events/stock"
+
+async def send_response(send, status, body):
+  await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", b"application/json")]})
+  await send({"type": "http.response.body", "body": json.dumps(body).encode()})
+
+def subscription_channels(params):
+  channels = [f"group:{group}" for group in params.get("group", [])] + [f"shop:{shop}" for shop in params.get("shop", [])]
+  return channels or ["inventory"]
+
+async def stock_events(scope, receive, send):
+  params = parse_qs(scope["query_string"].decode())
+  token = params.get("token", [None])[0]
+  user = await sync_to_async(decodeJWT)(f"Bearer {token}" if token else None)
+  if user is None:
+    await send_response(send, 403, {"detail": "Authentication credentials were not provided."})
+    return
+
+  broadcaster = get_broadcaster()
+  subscription = broadcaster.subscribe(subscription_channels(params))
+  disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+  try:
+    await send({
+      "type": "http.response.start",
+      "status": 200,
+      "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"), (b"x-accel-buffering", b"no")],
+    })
+    while not disconnected.done():
+      next_event = asyncio.ensure_future(subscription.queue.get())
+      done, _ = await asyncio.wait(
+        {next_event, disconnected}, timeout=settings.STOCK_EVENTS_HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+      )
+      if next_event in done:
+        message = f"event: stock\ndata: {json.dumps(next_event.result())}\n\n"
+      else:
+        next_event.cancel()
+        message = ": keep-alive\n\n"
+      if not disconnected.done():
+        await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+  finally:
+    broadcaster.unsubscribe(subscription)
+    disconnected.cancel()
+
+async def wait_for_disconnect(receive):
+  while (await receive())["type"] != "http.disconnect":
+    pass
@@ -0,0 +1,140 @@
+import random
+import time
+from datetime import datetime
+from contextlib import ExitStack
+from unittest import mock, skipUnless
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from app_control.filters import InventoryFilter
+from app_control.models import Inventory
+from profile_control.models import RequestProfile
+from user_control.models import CustomUser
+from . import db_router
+from .batch import BatchView
+from .filters import FilterSet
+from .utils import decodeJWT, get_access_token
+
+# Create your tests here.
+class BatchTests(TransactionTestCase):
+  # The sub-requests run in other threads, on their own connections: the test data has to be committed
+  def setUp(self):
+    self.user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    self.token = get_access_token({"user_id": self.user.id}, 1)
+    
+  def batch(self, *paths):
+    request = APIRequestFactory().post(
+      "/batch", {"requests": [{"path": path} for path in paths]}, format="json", HTTP_AUTHORIZATION=f"Bearer {self.token}"
+    )
+    return BatchView.as_view({"post": "create"})(request)
+    
+  def test_each_sub_request_has_its_own_status(self):
+    profile = RequestProfile.objects.create(
+      method="GET", path="/app/inventory", trigger="header", status_code=200, duration_ms=1, sql_count=0,
+      sql_duration_ms=0, raw_stats=b"\xff\x00"
+    )
+    paths = ["/user/me", "/app/inventory/999", "/nope", "/admin/", f"/profile/profiles/{profile.id}/download"]
+    
+    response = self.batch(*paths)
+    self.assertEqual(response.status_code, 200)
+    responses = response.data["responses"]
+    self.assertEqual([sub_response["path"] for sub_response in responses], paths)
+    self.assertEqual([sub_response["status"] for sub_response in responses], [200, 404, 404, 400, 406])
+    self.assertEqual(responses[0]["body"]["email"], "owner@example.com")
+    
+  def test_batches_cannot_be_nested(self):
+    response = self.batch("/batch")
+    self.assertEqual(response.data["responses"][0]["status"], 400)
+    
+  def test_sub_requests_reuse_the_authentication_of_the_batch(self):
+    with mock.patch("inventory_api.custom_methods.decodeJWT", wraps=decodeJWT) as decode:
+      response = self.batch("/user/me", "/app/group", "/job/jobs")
+    self.assertEqual([sub_response["status"] for sub_response in response.data["responses"]], [200, 200, 200])
+    self.assertEqual(decode.call_count, 1)
+    
+  @override_settings(BATCH_MAX_REQUESTS=2)
+  def test_batch_size_is_capped(self):
+    self.assertEqual(self.batch("/user/me", "/user/me", "/user/me").status_code, 400)
+    
+  @override_settings(BATCH_TIMEOUT_SECONDS=0.05)
+  def test_sub_request_still_running_after_the_timeout_is_reported(self):
+    def slow(parent, path):
+      time.sleep(0.5)
+      return {"path": path, "status": 200, "body": {}}
+    
+    with mock.patch("inventory_api.batch.run_sub_request", side_effect=slow):
+      response = self.batch("/user/me")
+    self.assertEqual(response.data["responses"][0]["status"], 504)
+
+@skipUnless(db_router.replica_aliases(), "needs a read replica, see DB_REPLICA_HOSTS")
+class ReplicaRoutingTests(TransactionTestCase):
+  # The replicas mirror the test database (TEST MIRROR in settings.py) on their own connections, they only see committed data
+  databases = {"default", *db_router.replica_aliases()}
+  
+  def setUp(self):
+    user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    self.item = Inventory.objects.create(name="Item", total=10, created_by=user)
+    self.auth = {"HTTP_AUTHORIZATION": f"Bearer {get_access_token({'user_id': user.id}, 1)}"}
+    cache.clear()
+    db_router._replica_health.clear()
+    
+  def queries(self, method, path, **data):
+    with ExitStack() as stack:
+      primary = stack.enter_context(CaptureQueriesContext(connections["default"]))
+      replicas = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in db_router.replica_aliases()]
+      response = getattr(self.client, method)(path, data, content_type="application/json", **self.auth)
+    self.assertLess(response.status_code, 400, response.content)
+    return len(primary), sum(len(replica) for replica in replicas)
+    
+  def test_get_reads_from_a_single_replica_for_the_whole_request(self):
+    with mock.patch("inventory_api.db_router.random.choice", wraps=random.choice) as choice:
+      primary, replica = self.queries("get", "/app/group")
+    self.assertEqual(primary, 0)
+    self.assertGreater(replica, 1)
+    self.assertEqual(choice.call_count, 1)
+    
+  def test_reads_stay_on_the_primary_after_a_write(self):
+    self.queries("post", f"/app/inventory/{self.item.id}/movements", kind="receipt", quantity=1)
+    
+    primary, replica = self.queries("get", "/app/group")
+    self.assertEqual(replica, 0)
+    self.assertGreater(primary, 0)
+    
+  def test_reads_fall_back_to_the_primary_when_the_replica_is_unhealthy(self):
+    with mock.patch("inventory_api.db_router.check_replica", return_value=False):
+      primary, replica = self.queries("get", "/app/group")
+    self.assertEqual(replica, 0)
+    self.assertGreater(primary, 0)
+
+class FilterSetTests(SimpleTestCase):
+  def test_params_are_converted_and_reserved_params_skipped(self):
+    filters = InventoryFilter({
+      "group_id": "3", "price__gte": "9.5", "created_at__lt": "2024-01-02", "page": "2", "keyword": "desk", "format": "json"
+    })
+    self.assertEqual(filters.lookups, {
+      "group_id": 3, "price__gte": 9.5, "created_at__lt": timezone.make_aware(datetime(2024, 1, 2))
+    })
+    
+  def test_invalid_values_and_undeclared_params_are_rejected(self):
+    with self.assertRaises(ValidationError) as error:
+      InventoryFilter({"group_id": "three", "created_at__gte": "yesterday", "name": "desk", "group_id__gt": "1", "price__in": "1"})
+    self.assertEqual(set(error.exception.detail), {"group_id", "created_at__gte", "name", "group_id__gt", "price__in"})
+    
+  def test_ranges_on_several_fields_need_an_equality_filter(self):
+    with self.assertRaises(ValidationError) as error:
+      InventoryFilter({"price__gte": "10", "remaining__lt": "5"})
+    self.assertIn("filters", error.exception.detail)
+    
+    filters = InventoryFilter({"price__gte": "10", "remaining__lt": "5", "group_id": "3"})
+    self.assertEqual(filters.lookups, {"price__gte": 10.0, "remaining__lt": 5, "group_id": 3})
+    
+  def test_fields_without_an_index_cannot_be_declared(self):
+    with self.assertRaises(ImproperlyConfigured):
+      class NameFilter(FilterSet):
+        model = Inventory
+        exact_fields = {"name": str}
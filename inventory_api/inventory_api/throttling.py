@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+'''
+Token bucket rate limiting, used by LoginView to stop bursts of login attempts (credential stuffing) from using up the CPU
+on password hashing.
+
+Every key (an IP address, an email...) gets a bucket of `burst` tokens that refills at `rate_per_minute`. Each attempt
+takes a token, and attempts are refused while the bucket is empty.
+
+- TokenBucket keeps the buckets in the memory of the process, which is the cheapest option but limits every process
+  separately. Only the max_keys most recently used buckets are kept, the one unused for longest is dropped first.
+- CacheTokenBucket keeps them in the Django cache, so all processes sharing that cache (Redis, Memcached...) share the
+  limits. Concurrent attempts can race on the same bucket, which lets a few extra attempts through at worst.
+
+LOGIN_RATE_LIMIT_BACKEND selects the one used for logins.
+'''
+
+class TokenBucket:
+  max_keys = 100000
+
+  def __init__(self, name, rate_per_minute, burst):
+    self.name = name
+    self.rate = rate_per_minute / 60
+    self.burst = burst
+    self._buckets = OrderedDict()
+    self._lock = threading.Lock()
+
+  def refill(self, tokens, updated, now):
+    return min(self.burst, tokens + (now - updated) * self.rate)
+
+  def allow(self, key):
+    now = time.monotonic()
+    with self._lock:
+      tokens, updated = self._buckets.get(key, (self.burst, now))
+      tokens = self.refill(tokens, updated, now)
+      allowed = tokens >= 1
+      self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+      self._buckets.move_to_end(key)
+      if len(self._buckets) > self.max_keys:
+        self._buckets.popitem(last=False)
+    return allowed
+
+class CacheTokenBucket(TokenBucket):
+  def allow(self, key):
+    cache_key = f"token-bucket:{self.name}:{key}"
+    now = time.time()
+    tokens, updated = cache.get(cache_key, (self.burst, now))
+    tokens = self.refill(tokens, updated, now)
+    allowed = tokens >= 1
+    # Kept until the bucket would be full again, after which a missing entry means the same thing
+    timeout = int((self.burst - tokens + 1) / self.rate) + 1
+    cache.set(cache_key, (tokens - 1 if allowed else tokens, now), timeout=timeout)
+    return allowed
+
+def get_rate_limiter(name, rate_per_minute, burst):
+  return import_string(settings.LOGIN_RATE_LIMIT_BACKEND)(name, rate_per_minute, burst)
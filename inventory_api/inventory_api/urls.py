@@ -14,10 +14,17 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
+from .batch import BatchView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("user/", include('user_control.urls'))
-]
+    path("user/", include('user_control.urls')),
+    path("app/", include('app_control.urls')),
+    path("job/", include('job_control.urls')),
+    path("profile/", include('profile_control.urls')),
+    path("batch", BatchView.as_view({"post": "create"}), name="batch")
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
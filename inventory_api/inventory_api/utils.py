@@ -4,7 +4,10 @@ from django.conf import settings
 from user_control.models import CustomUser
 from rest_framework.pagination import PageNumberPagination
 import re
+from django.core.paginator import Paginator
+from django.db import connections
 from django.db.models import Q
+from django.utils.functional import cached_property
 
 # After user login, how long can he/she access the website without logging in again
 def get_access_token(payload, days):
@@ -47,6 +50,26 @@ def decodeJWT(bearer):
 class CustomPagination(PageNumberPagination):
   page_size = 20
   
+class EstimatedCountPaginator(Paginator):
+  '''
+  Paginator for admin change lists of large tables. An exact COUNT(*) has to read the whole table, so for an unfiltered
+  list on PostgreSQL the row estimate the planner keeps in pg_class is used instead, once the table has more than
+  estimate_above rows. Filtered lists, small tables and other databases still get the exact count.
+  '''
+  estimate_above = 100000
+  
+  @cached_property
+  def count(self):
+    queryset = self.object_list
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql" and not queryset.query.where:
+      with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+      if row and row[0] > self.estimate_above:
+        return row[0]
+    return super().count
+  
 def normalize_query(query_string, findterms=re.compile(r'"([^"]+)"|(\S+)').findall, normspace=re.compile(r'\s{2,}').sub):
     return [normspace(' ', (t[0] or t[1]).strip()) for t in findterms(query_string)]
 
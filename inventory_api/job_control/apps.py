@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobControlConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'job_control'
+
+    def ready(self):
+        # Each app registers its background jobs in a jobs.py module
+        autodiscover_modules('jobs')
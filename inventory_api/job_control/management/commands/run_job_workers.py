@@ -0,0 +1,72 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections
+from job_control.queue import claim_job, run_job
+
+logger = logging.getLogger(__name__)
+
+def work(stop, poll_interval):
+  # A forked worker must not reuse the database connections of its parent
+  connections.close_all()
+  name = f"{socket.gethostname()}:{os.getpid()}"
+  signal.signal(signal.SIGINT, signal.SIG_IGN)
+  
+  while not stop.is_set():
+    try:
+      job = claim_job(name)
+      if job is None:
+        stop.wait(poll_interval)
+        continue
+      run_job(job)
+    except Exception:
+      # The database went away, a result could not be saved... the job is claimed again once it times out.
+      # Closing the connections makes the next iteration open fresh ones
+      logger.exception("job worker %s failed, retrying in %s seconds", name, poll_interval)
+      connections.close_all()
+      stop.wait(poll_interval)
+  connections.close_all()
+
+class Command(BaseCommand):
+  '''
+  Starts a pool of worker processes that run queued jobs. No external broker is needed, the Job table is the queue.
+  A worker that dies is replaced by a new one.
+  Stop it with Ctrl+C or SIGTERM: every worker finishes the job it is running before it exits.
+  '''
+  help = "Run background job workers"
+  
+  def add_arguments(self, parser):
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--poll-interval", type=float, default=1, help="Seconds to wait when the queue is empty")
+    
+  def handle(self, *args, **options):
+    stop = multiprocessing.Event()
+    connections.close_all()
+    
+    def start_worker():
+      worker = multiprocessing.Process(target=work, args=(stop, options["poll_interval"]), daemon=True)
+      worker.start()
+      return worker
+    
+    workers = [start_worker() for _ in range(options["processes"])]
+    self.stdout.write(f"started {len(workers)} job workers")
+    
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    try:
+      while not stop.is_set():
+        for i, worker in enumerate(workers):
+          if not worker.is_alive() and not stop.is_set():
+            logger.warning("job worker %s exited with code %s, starting a new one", worker.pid, worker.exitcode)
+            workers[i] = start_worker()
+        time.sleep(1)
+    except KeyboardInterrupt:
+      pass
+    finally:
+      stop.set()
+      for worker in workers:
+        worker.join()
+    self.stdout.write(self.style.SUCCESS("job workers stopped"))
@@ -0,0 +1,37 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from user_control.models import CustomUser
+
+# Create your models here.
+JobStatuses = (("queued", "queued"), ("running", "running"), ("succeeded", "succeeded"), ("failed", "failed"))
+
+class Job(models.Model):
+  '''
+  A unit of background work. Requests only insert a row and return its id, the workers started by the run_job_workers
+  command claim queued jobs with SELECT ... FOR UPDATE SKIP LOCKED and run them outside of the request/response cycle.
+  '''
+  name = models.CharField(max_length=100)
+  payload = models.JSONField(default=dict)
+  status = models.CharField(max_length=10, choices=JobStatuses, default="queued")
+  attempts = models.PositiveSmallIntegerField(default=0)
+  max_attempts = models.PositiveSmallIntegerField(default=3)
+  # Jobs are not claimed before this time, failed attempts push it back (see queue.run_job)
+  run_after = models.DateTimeField(default=timezone.now)
+  result = models.JSONField(null=True)
+  error = models.TextField(blank=True, default="")
+  worker = models.CharField(max_length=100, blank=True, default="")
+  created_by = models.ForeignKey(CustomUser, null=True, related_name="jobs", on_delete=models.SET_NULL)
+  created_at = models.DateTimeField(auto_now_add=True)
+  started_at = models.DateTimeField(null=True)
+  finished_at = models.DateTimeField(null=True)
+  
+  class Meta:
+    ordering = ("-created_at", )
+    indexes = [
+      # Workers only ever look for queued and running jobs, the index stays small however many finished jobs pile up
+      models.Index(fields=("status", "run_after"), condition=Q(status__in=("queued", "running")), name="job_pending_idx"),
+    ]
+    
+  def __str__(self):
+    return f"{self.name} ({self.status})"
@@ -0,0 +1,130 @@
+import inspect
+import json
+import logging
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .models import Job
+
+'''
+Registry and life cycle of background jobs.
+
+A job is a plain function registered with the @job decorator in the jobs.py module of an app, it receives the job payload
+as keyword arguments and may return a JSON serializable result (dates, decimals and UUIDs are stored as strings):
+
+  @job("app_control.take_stock_snapshots", public=True)
+  def take_stock_snapshots():
+    return {"snapshots": take_snapshots()}
+
+  enqueue("app_control.take_stock_snapshots")
+
+Only jobs registered with public=True can be started through the API. A job that raises is retried with exponential backoff
+until it has used max_attempts, after which it is marked as failed. A running job whose worker died is claimed again once it
+has been running for longer than JOB_TIMEOUT_SECONDS, or marked as failed when that was its last attempt.
+'''
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+class JobDefinition:
+  def __init__(self, func, max_attempts, public):
+    self.func = func
+    self.max_attempts = max_attempts
+    self.public = public
+    
+  def check_payload(self, payload):
+    '''
+    Raises TypeError when the payload does not match the arguments of the job function, so that such a job is refused
+    when it is queued instead of failing on every attempt.
+    '''
+    inspect.signature(self.func).bind(**payload)
+
+def job(name, max_attempts=3, public=False):
+  def decorator(func):
+    registry[name] = JobDefinition(func, max_attempts, public)
+    return func
+  return decorator
+
+def enqueue(name, payload=None, user=None, delay=0):
+  '''
+  Queues a job and returns it without waiting for it. Called inside a transaction, the job only becomes visible to the
+  workers once that transaction commits.
+  '''
+  if name not in registry:
+    raise Exception(f"job '{name}' is not registered")
+  registry[name].check_payload(payload or {})
+  return Job.objects.create(
+    name=name,
+    payload=payload or {},
+    max_attempts=registry[name].max_attempts,
+    run_after=timezone.now() + timedelta(seconds=delay),
+    created_by=user
+  )
+
+def claim_job(worker):
+  '''
+  Marks the next due job as running and returns it, or returns None when there is nothing to do.
+  SKIP LOCKED lets any number of workers poll at the same time without waiting for, or claiming, each other's rows.
+  '''
+  now = timezone.now()
+  stalled = now - timedelta(seconds=settings.JOB_TIMEOUT_SECONDS)
+  with transaction.atomic():
+    while True:
+      job = (
+        Job.objects.select_for_update(skip_locked=True)
+        .filter(Q(status="queued", run_after__lte=now) | Q(status="running", started_at__lt=stalled))
+        .order_by("run_after")
+        .first()
+      )
+      if job is None:
+        return None
+      if job.status == "queued" or job.attempts < job.max_attempts:
+        break
+      # The worker died during the last attempt (killed, out of memory...), the job may well be what brought it down
+      job.status = "failed"
+      job.error = f"worker {job.worker} stopped during the last attempt"
+      job.finished_at = now
+      job.save(update_fields=["status", "error", "finished_at"])
+      logger.warning("job %s (%s) failed, its worker stopped on attempt %s", job.id, job.name, job.attempts)
+    job.status = "running"
+    job.attempts += 1
+    job.worker = worker
+    job.started_at = now
+    job.save(update_fields=["status", "attempts", "worker", "started_at"])
+  return job
+
+def backoff(attempts):
+  return min(settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_BACKOFF_SECONDS)
+
+def run_job(job):
+  definition = registry.get(job.name)
+  try:
+    if definition is None:
+      raise Exception(f"job '{job.name}' is not registered")
+    # Serialized here, a result that JSON cannot store fails the attempt rather than the final UPDATE
+    job.result = json.loads(json.dumps(definition.func(**job.payload), cls=DjangoJSONEncoder))
+  except Exception:
+    job.error = traceback.format_exc()
+    logger.warning("job %s (%s) failed on attempt %s", job.id, job.name, job.attempts, exc_info=True)
+    if definition is not None and job.attempts < job.max_attempts:
+      job.status = "queued"
+      job.run_after = timezone.now() + timedelta(seconds=backoff(job.attempts))
+    else:
+      job.status = "failed"
+      job.finished_at = timezone.now()
+  else:
+    job.status = "succeeded"
+    job.error = ""
+    job.finished_at = timezone.now()
+  # A job that ran past JOB_TIMEOUT_SECONDS may have been claimed by another worker since, its outcome is the one kept
+  claimed = Job.objects.filter(id=job.id, status="running", worker=job.worker, attempts=job.attempts).update(
+    status=job.status, result=job.result, error=job.error, run_after=job.run_after, finished_at=job.finished_at
+  )
+  if not claimed:
+    logger.warning("job %s (%s) was claimed by another worker, the result of %s is dropped", job.id, job.name, job.worker)
+  return job
@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from .models import Job
+
+class JobSerializer(serializers.ModelSerializer):
+  class Meta:
+    model = Job
+    exclude = ("worker", )
+    
+class CreateJobSerializer(serializers.Serializer):
+  name = serializers.CharField()
+  payload = serializers.DictField(required=False, default=dict)
@@ -0,0 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from inventory_api.utils import get_access_token
+from user_control.models import CustomUser
+from .management.commands.run_job_workers import work
+from .models import Job
+from .queue import claim_job, enqueue, job, run_job
+from .views import JobView
+
+# Create your tests here.
+@job("job_control.tests.echo")
+def echo(value):
+  return value
+
+@job("job_control.tests.price", public=True)
+def price(code):
+  return {"code": code, "price": Decimal("9.90"), "at": timezone.now()}
+
+@override_settings(JOB_TIMEOUT_SECONDS=60)
+class ClaimJobTests(TestCase):
+  def stalled_job(self, attempts, max_attempts):
+    return Job.objects.create(
+      name="job_control.tests.echo", payload={"value": 1}, status="running", worker="dead-worker",
+      attempts=attempts, max_attempts=max_attempts, started_at=timezone.now() - timedelta(minutes=5)
+    )
+    
+  def test_stalled_job_is_claimed_again_while_it_has_attempts_left(self):
+    stalled = self.stalled_job(attempts=1, max_attempts=2)
+    
+    claimed = claim_job("worker-2")
+    self.assertEqual((claimed.id, claimed.worker, claimed.attempts), (stalled.id, "worker-2", 2))
+    
+  def test_stalled_job_on_its_last_attempt_is_marked_failed(self):
+    stalled = self.stalled_job(attempts=1, max_attempts=1)
+    
+    self.assertIsNone(claim_job("worker-2"))
+    stalled.refresh_from_db()
+    self.assertEqual((stalled.status, stalled.attempts), ("failed", 1))
+    
+  def test_result_of_a_worker_that_lost_its_job_is_dropped(self):
+    stalled = self.stalled_job(attempts=1, max_attempts=2)
+    claimed = claim_job("worker-2")
+    claimed.payload = {"value": 2}
+    run_job(claimed)
+    
+    run_job(stalled)
+    stalled.refresh_from_db()
+    self.assertEqual((stalled.status, stalled.result, stalled.worker), ("succeeded", 2, "worker-2"))
+
+class RunJobTests(TestCase):
+  def test_result_is_stored_as_json(self):
+    enqueue("job_control.tests.price", {"code": "A1"})
+    job = claim_job("worker-1")
+    
+    run_job(job)
+    job.refresh_from_db()
+    self.assertEqual((job.status, job.result["price"]), ("succeeded", "9.90"))
+    
+  def test_worker_survives_a_failing_iteration(self):
+    stop = mock.Mock()
+    stop.is_set.side_effect = [False, False, True]
+    commands = "job_control.management.commands.run_job_workers"
+    with mock.patch(f"{commands}.connections"), self.assertLogs(commands, "ERROR"), \
+        mock.patch(f"{commands}.claim_job", side_effect=[Exception("connection lost"), None]) as claim:
+      work(stop, 0)
+    self.assertEqual(claim.call_count, 2)
+    
+  def test_payload_that_does_not_match_the_job_is_refused(self):
+    user = CustomUser.objects.create(email="owner@example.com", fullname="Owner", role="admin")
+    token = get_access_token({"user_id": user.id}, 1)
+    request = APIRequestFactory().post(
+      "/job/jobs", {"name": "job_control.tests.price", "payload": {"sku": "A1"}}, format="json",
+      HTTP_AUTHORIZATION=f"Bearer {token}"
+    )
+    
+    response = JobView.as_view({"post": "create"})(request)
+    self.assertEqual(response.status_code, 400)
+    self.assertFalse(Job.objects.exists())
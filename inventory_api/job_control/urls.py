@@ -0,0 +1,10 @@
+from django.urls import path, include
+from .views import JobView
+from rest_framework.routers import DefaultRouter
+
+router = DefaultRouter(trailing_slash = False)
+router.register("jobs", JobView, "jobs")
+
+urlpatterns = [
+    path("", include(router.urls))
+]
@@ -0,0 +1,42 @@
+from rest_framework.viewsets import ModelViewSet
+from rest_framework.response import Response
+from rest_framework import status
+from inventory_api.custom_methods import IsAuthenticatedCustom
+from inventory_api.utils import CustomPagination
+from user_control.views import add_user_activity
+from .serializers import CreateJobSerializer, Job, JobSerializer
+from .queue import enqueue, registry
+
+# Create your views here.
+class JobView(ModelViewSet):
+  '''
+  Starting a job returns its id straight away (202 Accepted), the client then polls the job to follow its status and result.
+  Users only see the jobs they started.
+  '''
+  http_method_names = ["get", "post"]
+  queryset = Job.objects.all()
+  serializer_class = JobSerializer
+  permission_classes = (IsAuthenticatedCustom, )
+  pagination_class = CustomPagination
+  
+  def get_queryset(self):
+    return self.queryset.filter(created_by=self.request.user)
+  
+  def create(self, request):
+    valid_req = CreateJobSerializer(data=request.data)
+    valid_req.is_valid(raise_exception=True)
+    
+    name = valid_req.validated_data["name"]
+    definition = registry.get(name)
+    if definition is None or not definition.public:
+      return Response({"error": f"job '{name}' cannot be started"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    payload = valid_req.validated_data["payload"]
+    try:
+      definition.check_payload(payload)
+    except TypeError as e:
+      return Response({"error": f"invalid payload for job '{name}': {e}"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    job = enqueue(name, payload, user=request.user)
+    add_user_activity(request.user, f"started job - '{name}'")
+    return Response({"job_id": job.id, "status": job.status}, status=status.HTTP_202_ACCEPTED)
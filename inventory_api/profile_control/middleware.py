@@ -0,0 +1,108 @@
+import cProfile
+import marshal
+import pstats
+import random
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from inventory_api.utils import decodeJWT
+from .models import RequestProfile
+
+'''
+Runs single requests under cProfile and stores the result as a RequestProfile.
+
+A request is profiled when an admin sends the X-Profile header with it, or when it is picked by sampling
+(PROFILE_SAMPLE_RATE, a fraction between 0 and 1, 0 by default). Every other request only pays for a dictionary lookup
+and, with sampling enabled, one random number.
+'''
+
+def _function_label(function):
+  file_name, line, name = function
+  if file_name == "~":
+    return name
+  return f"{name} ({file_name}:{line})"
+
+def _call_tree(stats):
+  '''
+  The PROFILE_MAX_FUNCTIONS functions with the highest cumulative time, each with the functions that called it.
+  '''
+  entries = sorted(stats.stats.items(), key=lambda entry: entry[1][3], reverse=True)
+  return [
+    {
+      "function": _function_label(function),
+      "calls": calls,
+      "total_ms": round(total * 1000, 3),
+      "cumulative_ms": round(cumulative * 1000, 3),
+      "callers": [_function_label(caller) for caller in callers],
+    }
+    for function, (_, calls, total, cumulative, callers) in entries[:settings.PROFILE_MAX_FUNCTIONS]
+  ]
+
+class ProfilingMiddleware:
+  def __init__(self, get_response):
+    self.get_response = get_response
+
+  def __call__(self, request):
+    trigger = self.get_trigger(request)
+    if trigger is None:
+      return self.get_response(request)
+    return self.profile(request, trigger)
+
+  def get_trigger(self, request):
+    if "HTTP_X_PROFILE" in request.META:
+      user = decodeJWT(request.META.get("HTTP_AUTHORIZATION"))
+      if user is not None and (user.role == "admin" or user.is_superuser):
+        request.profiling_user = user
+        return "header"
+    if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+      return "sample"
+    return None
+
+  def profile(self, request, trigger):
+    queries = []
+
+    def record_query(execute, sql, params, many, context):
+      started = time.perf_counter()
+      try:
+        return execute(sql, params, many, context)
+      finally:
+        queries.append({
+          "sql": sql,
+          "database": context["connection"].alias,
+          "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+        })
+
+    profiler = cProfile.Profile()
+    with ExitStack() as stack:
+      for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(record_query))
+      started = time.perf_counter()
+      profiler.enable()
+      try:
+        response = self.get_response(request)
+      finally:
+        profiler.disable()
+      duration = time.perf_counter() - started
+
+    stats = pstats.Stats(profiler)
+    RequestProfile.objects.create(
+      method=request.method,
+      path=request.path[:255],
+      query_string=request.META.get("QUERY_STRING", ""),
+      user=getattr(request, "profiling_user", None),
+      trigger=trigger,
+      status_code=response.status_code,
+      duration_ms=round(duration * 1000, 3),
+      sql_count=len(queries),
+      sql_duration_ms=round(sum(query["duration_ms"] for query in queries), 3),
+      sql=queries,
+      functions=_call_tree(stats),
+      raw_stats=marshal.dumps(stats.stats)
+    )
+
+    # Only the most recent profiles are kept
+    expired = RequestProfile.objects.order_by("-id").values_list("id", flat=True)[settings.PROFILE_KEEP:settings.PROFILE_KEEP + 1]
+    if expired:
+      RequestProfile.objects.filter(id__lte=expired[0]).delete()
+    return response
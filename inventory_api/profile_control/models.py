@@ -0,0 +1,29 @@
+from django.db import models
+from user_control.models import CustomUser
+
+# Create your models here.
+class RequestProfile(models.Model):
+  '''
+  One request that ran under the profiler (see middleware.ProfilingMiddleware).
+  functions holds the most expensive functions of the call tree with their callers, sql every query with its duration,
+  and raw_stats the complete profile in the pstats format, for tools such as snakeviz.
+  '''
+  method = models.CharField(max_length=10)
+  path = models.CharField(max_length=255)
+  query_string = models.TextField(blank=True, default="")
+  user = models.ForeignKey(CustomUser, null=True, related_name="request_profiles", on_delete=models.SET_NULL)
+  trigger = models.CharField(max_length=10)
+  status_code = models.PositiveSmallIntegerField()
+  duration_ms = models.FloatField()
+  sql_count = models.PositiveIntegerField()
+  sql_duration_ms = models.FloatField()
+  sql = models.JSONField(default=list)
+  functions = models.JSONField(default=list)
+  raw_stats = models.BinaryField()
+  created_at = models.DateTimeField(auto_now_add=True)
+  
+  class Meta:
+    ordering = ("-created_at", )
+    
+  def __str__(self):
+    return f"{self.method} {self.path} - {self.duration_ms:.0f}ms"
@@ -0,0 +1,17 @@
+from rest_framework import serializers
+from user_control.serializers import CustomUserSerializer
+from .models import RequestProfile
+
+class RequestProfileListSerializer(serializers.ModelSerializer):
+  user = CustomUserSerializer(read_only=True)
+  
+  class Meta:
+    model = RequestProfile
+    exclude = ("sql", "functions", "raw_stats")
+    
+class RequestProfileSerializer(serializers.ModelSerializer):
+  user = CustomUserSerializer(read_only=True)
+  
+  class Meta:
+    model = RequestProfile
+    exclude = ("raw_stats", )
@@ -0,0 +1,44 @@
+from django.test import TestCase, override_settings
+from inventory_api.utils import get_access_token
+from user_control.models import CustomUser
+from .models import RequestProfile
+
+# Create your tests here.
+@override_settings(PROFILE_SAMPLE_RATE=0)
+class ProfilingTests(TestCase):
+  def setUp(self):
+    self.admin = CustomUser.objects.create(email="admin@example.com", fullname="Admin", role="admin")
+    self.seller = CustomUser.objects.create(email="seller@example.com", fullname="Seller", role="sale")
+    
+  def get(self, path, user, **headers):
+    return self.client.get(path, HTTP_AUTHORIZATION=f"Bearer {get_access_token({'user_id': user.id}, 1)}", **headers)
+    
+  def test_profile_header_of_a_non_admin_is_ignored(self):
+    response = self.get("/user/me", self.seller, HTTP_X_PROFILE="1")
+    
+    self.assertEqual(response.status_code, 200)
+    self.assertFalse(RequestProfile.objects.exists())
+    
+  def test_request_of_an_admin_is_profiled(self):
+    response = self.get("/user/me", self.admin, HTTP_X_PROFILE="1")
+    
+    self.assertEqual(response.status_code, 200)
+    profile = RequestProfile.objects.get()
+    self.assertEqual((profile.path, profile.user, profile.trigger, profile.status_code), ("/user/me", self.admin, "header", 200))
+    self.assertEqual(profile.sql_count, len(profile.sql))
+    self.assertTrue(any("user_control_customuser" in query["sql"] for query in profile.sql))
+    self.assertTrue(profile.functions)
+    self.assertTrue(bytes(profile.raw_stats))
+    
+  @override_settings(PROFILE_KEEP=2)
+  def test_only_the_most_recent_profiles_are_kept(self):
+    for path in ("/user/me", "/job/jobs", "/profile/profiles"):
+      self.get(path, self.admin, HTTP_X_PROFILE="1")
+    
+    self.assertEqual(list(RequestProfile.objects.order_by("id").values_list("path", flat=True)), ["/job/jobs", "/profile/profiles"])
+    
+  def test_profiles_are_only_shown_to_admins(self):
+    self.get("/user/me", self.admin, HTTP_X_PROFILE="1")
+    
+    self.assertEqual(self.get("/profile/profiles", self.seller).status_code, 403)
+    self.assertEqual(self.get("/profile/profiles", self.admin).status_code, 200)
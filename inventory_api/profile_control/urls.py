@@ -0,0 +1,10 @@
+from django.urls import path, include
+from .views import RequestProfileView
+from rest_framework.routers import DefaultRouter
+
+router = DefaultRouter(trailing_slash = False)
+router.register("profiles", RequestProfileView, "profiles")
+
+urlpatterns = [
+    path("", include(router.urls))
+]
@@ -0,0 +1,34 @@
+from django.http import HttpResponse
+from rest_framework.decorators import action
+from rest_framework.viewsets import ModelViewSet
+from inventory_api.custom_methods import IsAdminCustom
+from inventory_api.utils import CustomPagination
+from .serializers import RequestProfile, RequestProfileListSerializer, RequestProfileSerializer
+
+# Create your views here.
+class RequestProfileView(ModelViewSet):
+  '''
+  Recent profiled requests, newest first. The list leaves out the call tree and the SQL log, retrieve a single profile to
+  see them, or download its pstats file.
+  '''
+  http_method_names = ["get"]
+  queryset = RequestProfile.objects.select_related("user")
+  permission_classes = (IsAdminCustom, )
+  pagination_class = CustomPagination
+  
+  def get_queryset(self):
+    if self.action == "list":
+      return self.queryset.defer("sql", "functions", "raw_stats")
+    return self.queryset
+  
+  def get_serializer_class(self):
+    if self.action == "list":
+      return RequestProfileListSerializer
+    return RequestProfileSerializer
+  
+  @action(detail=True)
+  def download(self, request, pk=None):
+    profile = self.get_object()
+    response = HttpResponse(bytes(profile.raw_stats), content_type="application/octet-stream")
+    response["Content-Disposition"] = f'attachment; filename="request-{profile.id}.prof"'
+    return response
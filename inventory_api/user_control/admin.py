@@ -2,4 +2,10 @@ from django.contrib import admin
 from .models import CustomUser, UserActivities
 
 # Register your models here.
-admin.site.register((CustomUser, UserActivities))
\ No newline at end of file
+@admin.register(CustomUser)
+class CustomUserAdmin(admin.ModelAdmin):
+  list_display = ("email", "fullname", "role", "is_active", "created_at")
+  # Needed by the autocomplete widgets that pick created_by in the app_control admins
+  search_fields = ("=email", )
+  
+admin.site.register(UserActivities)
@@ -0,0 +1,74 @@
+import time
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+from inventory_api.hashers import ConfigurablePBKDF2PasswordHasher
+from inventory_api.throttling import TokenBucket
+from user_control.models import CustomUser
+from user_control.views import LoginView
+
+class Command(BaseCommand):
+  '''
+  Compares the cost of a password check with the given number of PBKDF2 iterations and with PASSWORD_PBKDF2_ITERATIONS,
+  then sends a burst of failing logins from one client through LoginView, once without and once with the login rate
+  limits, and times them. Everything written to the database is rolled back.
+  '''
+  help = "Benchmark password hashing cost and login throughput with and without the login rate limits"
+  
+  def add_arguments(self, parser):
+    parser.add_argument(
+      "--iterations", type=int, default=PBKDF2PasswordHasher.iterations,
+      help="Work factor to compare PASSWORD_PBKDF2_ITERATIONS with (default: Django's)"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=50, help="Size of the burst of logins from one client")
+    
+  def handle(self, *args, **options):
+    hasher = ConfigurablePBKDF2PasswordHasher()
+    for name, iterations in (("compared", options["iterations"]), ("configured", hasher.iterations)):
+      encoded = hasher.encode("correct horse battery staple", hasher.salt(), iterations)
+      elapsed = self.measure(lambda: hasher.verify("wrong password", encoded), options["repeat"])
+      self.stdout.write(
+        f"{name:<11} {iterations:>8} iterations  {elapsed * 1000:8.2f} ms/check  {1 / elapsed:8.1f} logins/s per core"
+      )
+      
+    requests = options["requests"]
+    unlimited = TokenBucket("unlimited", rate_per_minute=0, burst=requests)
+    views = {
+      "without limits": LoginView.as_view({"post": "create"}, ip_limiter=unlimited, email_limiter=unlimited),
+      # Fresh buckets from the settings, the ones of the running view may already hold attempts
+      "with limits": LoginView.as_view(
+        {"post": "create"},
+        ip_limiter=TokenBucket("login-ip", settings.LOGIN_IP_RATE_PER_MINUTE, settings.LOGIN_IP_BURST),
+        email_limiter=TokenBucket("login-email", settings.LOGIN_EMAIL_RATE_PER_MINUTE, settings.LOGIN_EMAIL_BURST),
+      ),
+    }
+    
+    self.stdout.write(f"\nburst of {requests} failing logins from one client through LoginView")
+    factory = APIRequestFactory()
+    with transaction.atomic():
+      user = CustomUser.objects.create(email="bench-login@example.com", fullname="Login benchmark", role="sale")
+      user.set_password("correct horse battery staple")
+      user.save()
+      for name, view in views.items():
+        started = time.perf_counter()
+        codes = [
+          view(factory.post("/user/login", {"email": user.email, "password": "wrong"}, format="json")).status_code
+          for _ in range(requests)
+        ]
+        elapsed = time.perf_counter() - started
+        refused = codes.count(429)
+        self.stdout.write(
+          f"  {name:<15} {elapsed:8.2f} s  {requests / elapsed:8.1f} requests/s  "
+          f"{requests - refused:>5} password checks  {refused:>5} refused"
+        )
+      transaction.set_rollback(True)
+      
+  def measure(self, func, repeat):
+    func()
+    started = time.perf_counter()
+    for _ in range(repeat):
+      func()
+    return (time.perf_counter() - started) / repeat
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.functions import Upper
+from django.contrib.auth.hashers import check_password
 from django.contrib.auth.models import (
   AbstractBaseUser, PermissionsMixin, BaseUserManager
 )
@@ -55,6 +57,16 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
   # CustomUserManager is a custom manager that inherits from BaseUserManager, and it provides some additional functionality for creating and managing user accounts. By setting objects = CustomUserManager() inside the CustomUser model, we are specifying that all instances of CustomUser should use CustomUserManager as their default manager. This means that all queries made on the CustomUser model will use CustomUserManager by default, unless another manager is specified explicitly.
   objects = CustomUserManager()
   
+  def check_password(self, raw_password):
+    '''
+    Same as AbstractBaseUser.check_password, except that a password hashed with outdated hasher settings is rehashed in the
+    background (see passwords.py) instead of during the login request.
+    '''
+    from .passwords import schedule_rehash
+    
+    encoded = self.password
+    return check_password(raw_password, encoded, lambda raw: schedule_rehash(self.id, encoded, raw))
+  
   def __str__(self):
     '''
     Returns a string representation of the user object. 
@@ -69,6 +81,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     Query sets will be ordered by the created_at field in ascending order.
     '''
     ordering = ("created_at", )
+    # Used by the case-insensitive email search of the admin
+    indexes = [models.Index(Upper("email"), name="customuser_email_upper_idx")]
     
 class UserActivities(models.Model):
   '''
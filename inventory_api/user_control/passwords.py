@@ -0,0 +1,23 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+'''
+Rehashing a password with the current hasher settings costs as much as the login that verified it. That work is done on a
+single background thread, so a login never pays for two hashes and a burst of logins cannot use more than one core for it.
+The raw password is only held in memory until the job has run, it is never written anywhere else.
+'''
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-rehash")
+
+def schedule_rehash(user_id, encoded, raw_password):
+  _executor.submit(rehash_password, user_id, encoded, raw_password)
+
+def rehash_password(user_id, encoded, raw_password):
+  from .models import CustomUser
+  
+  try:
+    # The password may have been changed in the meantime, only the hash that was verified is replaced
+    CustomUser.objects.filter(id=user_id, password=encoded).update(password=make_password(raw_password))
+  finally:
+    connection.close()
@@ -1,3 +1,30 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from inventory_api.throttling import TokenBucket
+from . import views
 
 # Create your tests here.
+class LoginRateLimitTests(TestCase):
+  def setUp(self):
+    self.view = views.LoginView.as_view(
+      {"post": "create"},
+      ip_limiter=TokenBucket("login-ip", rate_per_minute=1, burst=2),
+      email_limiter=TokenBucket("login-email", rate_per_minute=1, burst=100),
+    )
+    
+  def login(self, email, **headers):
+    request = APIRequestFactory().post("/user/login", {"email": email, "password": "wrong"}, format="json", **headers)
+    return self.view(request).status_code
+  
+  def test_attempts_from_one_ip_are_limited(self):
+    codes = [self.login(f"user{number}@example.com") for number in range(3)]
+    self.assertEqual(codes, [400, 400, 429])
+    
+  def test_x_forwarded_for_is_ignored_without_trusted_proxies(self):
+    codes = [self.login(f"user{number}@example.com", HTTP_X_FORWARDED_FOR=f"198.51.100.{number}") for number in range(3)]
+    self.assertEqual(codes[-1], 429)
+    
+  @override_settings(REST_FRAMEWORK={"NUM_PROXIES": 1})
+  def test_clients_behind_a_trusted_proxy_have_their_own_limits(self):
+    codes = [self.login(f"user{number}@example.com", HTTP_X_FORWARDED_FOR=f"198.51.100.{number}") for number in range(3)]
+    self.assertEqual(codes, [400, 400, 400])
@@ -3,10 +3,13 @@ from rest_framework.viewsets import ModelViewSet
 from .serializers import CreateUserSerializer, CustomUser, LoginSerializer, UpdatePasswordSerializer, CustomUserSerializer, UserActivities, UserActivitiesSerializer
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.throttling import BaseThrottle
+from django.conf import settings
 from django.contrib.auth import authenticate
-from datetime import datetime
+from django.utils import timezone
 from inventory_api.utils import get_access_token
 from inventory_api.custom_methods import IsAuthenticatedCustom
+from inventory_api.throttling import get_rate_limiter
 
 def add_user_activity(user, action):
   UserActivities.objects.create(
@@ -33,12 +36,22 @@ class CreateUserView(ModelViewSet):
 class LoginView(ModelViewSet):
   http_method_names = ["post"]
   queryset = CustomUser.objects.all()
-  serializer_class = LoginSerializer()
+  serializer_class = LoginSerializer
+  # Login attempts allowed per client IP and per email, see inventory_api/throttling.py
+  ip_limiter = get_rate_limiter("login-ip", settings.LOGIN_IP_RATE_PER_MINUTE, settings.LOGIN_IP_BURST)
+  email_limiter = get_rate_limiter("login-email", settings.LOGIN_EMAIL_RATE_PER_MINUTE, settings.LOGIN_EMAIL_BURST)
   
   def create(self, request):
     valid_req = self.serializer_class(data=request.data)
     valid_req.is_valid(raise_exception=True)
     
+    # Refused attempts are cheap, only the allowed ones go on to the expensive password check
+    email = valid_req.validated_data["email"].lower()
+    # get_ident() is the client IP, read from X-Forwarded-For behind the NUM_PROXIES trusted proxies
+    client_ip = BaseThrottle().get_ident(request)
+    if not self.ip_limiter.allow(client_ip) or not self.email_limiter.allow(email):
+      return Response({"error": "Too many login attempts, try again later"}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    
     # new_user = valid_req.validated_data["is_new_user"] retrieves the value of a boolean field called is_new_user from the validated data.
     # If new_user is true, the code checks if a user with the given email already exists in the CustomUser model.
     # If a user with the given email exists, the code checks if the user already has a password.
@@ -66,15 +79,15 @@ class LoginView(ModelViewSet):
       return Response({"error": "Invalid email or password"}, status=status.HTTP_400_BAD_REQUEST)
     
     access = get_access_token({"user_id": user.id}, 1)
-    user.last_login = datetime.now()
-    user.save()
+    user.last_login = timezone.now()
+    user.save(update_fields=["last_login"])
     add_user_activity(user, "logged in")
     return Response({"access": access})
   
 class UpdatePasswordView(ModelViewSet):
   http_method_names = ["post"]
   queryset = CustomUser.objects.all()
-  serializer_class = UpdatePasswordSerializer()
+  serializer_class = UpdatePasswordSerializer
   
   def create(self, request):
     valid_req = self.serializer_class(data=request.data)
@@ -92,7 +105,7 @@ class UpdatePasswordView(ModelViewSet):
 class MeView(ModelViewSet):
   http_method_names = ["get"]
   queryset = CustomUser.objects.all()
-  serializer_class = CustomUserSerializer()
+  serializer_class = CustomUserSerializer
   permission_classes = (IsAuthenticatedCustom, )
   
   def list(self, request):
@@ -102,19 +115,21 @@ class MeView(ModelViewSet):
 class UserActivitiesView(ModelViewSet):
   http_method_names = ["get"]
   queryset = UserActivities.objects.all()
-  serializer_class = UserActivitiesSerializer()
+  serializer_class = UserActivitiesSerializer
   permission_classes = (IsAuthenticatedCustom, )
+  use_read_replica = True
   
 class UsersView(ModelViewSet):
   http_method_names = ["get"]
   queryset = CustomUser.objects.all()
-  serializer_class = CustomUserSerializer()
+  serializer_class = CustomUserSerializer
   permission_classes = (IsAuthenticatedCustom, )
+  use_read_replica = True
   
   def list(self, request):
     '''
     Return a list of users that are not admin
     '''
-    users = self.queryset().filter(is_superuser = False)
+    users = self.queryset.filter(is_superuser = False)
     data = self.serializer_class(users, many = True).data
     return Response(data)
\ No newline at end of file